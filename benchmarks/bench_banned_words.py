@@ -0,0 +1,60 @@
+"""Micro-benchmark : boucle `word in content` contre l'automate BannedWordMatcher.
+
+Utilisation : python benchmarks/bench_banned_words.py [--words 10 100 1000 5000]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main import BannedWordMatcher
+
+def random_word(rng, min_len=4, max_len=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+def random_message(rng, length=120):
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(random_word(rng, 2, 8))
+    return " ".join(words)
+
+def naive_find(words, content):
+    """Ancienne boucle de on_message"""
+    content_lower = content.lower()
+    for word in words:
+        if word in content_lower:
+            return word
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    messages = [random_message(rng) for _ in range(args.messages)]
+
+    print(f"{'mots':>6} | {'boucle (µs/msg)':>16} | {'automate (µs/msg)':>18} | {'gain':>6}")
+    print("-" * 56)
+    for count in args.words:
+        words = list({random_word(rng) for _ in range(count)})
+        matcher = BannedWordMatcher(words)
+
+        # Les deux méthodes doivent donner le même verdict
+        for content in messages:
+            assert (naive_find(words, content) is None) == (matcher.find(content) is None)
+
+        naive = min(timeit.repeat(lambda: [naive_find(words, m) for m in messages], number=1, repeat=args.repeat))
+        compiled = min(timeit.repeat(lambda: [matcher.find(m) for m in messages], number=1, repeat=args.repeat))
+        naive_us = naive / len(messages) * 1e6
+        compiled_us = compiled / len(messages) * 1e6
+        print(f"{len(words):>6} | {naive_us:>16.2f} | {compiled_us:>18.2f} | {naive_us / compiled_us:>5.1f}x")
+
+if __name__ == "__main__":
+    main()
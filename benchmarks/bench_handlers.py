@@ -0,0 +1,415 @@
+"""Banc d'essai hors ligne : alimente les gestionnaires du bot avec du trafic synthétique.
+
+Aucun accès à Discord : les objets Message, Member, Guild et Interaction sont
+remplacés par des objets légers qui comptent les appels REST qu'ils reçoivent.
+
+Utilisation :
+    python benchmarks/bench_handlers.py                      # tous les scénarios
+    python benchmarks/bench_handlers.py --scenarios chat spam
+    python benchmarks/bench_handlers.py --json resultats.json
+    python benchmarks/bench_handlers.py --compare resultats.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import discord
+
+import main
+
+# Appels REST simulés, par type
+REST_CALLS = Counter()
+
+async def rest(kind):
+    REST_CALLS[kind] += 1
+
+class FakeRole:
+    def __init__(self, role_id, guild):
+        self.id = role_id
+        self.guild = guild
+        self.name = f"role-{role_id}"
+        self.mention = f"<@&{role_id}>"
+        self.permissions = discord.Permissions.general()
+
+    async def edit(self, **kwargs):
+        await rest("role.edit")
+
+class FakeMember:
+    def __init__(self, member_id, guild, administrator=False, created_at=None):
+        self.id = member_id
+        self.guild = guild
+        self.name = f"user{member_id}"
+        self.nick = None
+        self.mention = f"<@{member_id}>"
+        self.bot = False
+        self.administrator = administrator
+        self.roles = [guild.default_role]
+        self.created_at = created_at or datetime.now(timezone.utc) - timedelta(days=365)
+
+    @property
+    def guild_permissions(self):
+        # Comme discord.py : recalculé à chaque accès à partir de tous les rôles
+        value = 0
+        for role in self.roles:
+            value |= role.permissions.value
+        permissions = discord.Permissions(value)
+        if self.administrator:
+            permissions.administrator = True
+        return permissions
+
+    async def send(self, *args, **kwargs):
+        await rest("member.send")
+
+    async def timeout(self, *args, **kwargs):
+        await rest("member.timeout")
+
+    async def ban(self, **kwargs):
+        await rest("member.ban")
+
+    async def kick(self, **kwargs):
+        await rest("member.kick")
+
+    async def add_roles(self, *roles, **kwargs):
+        await rest("member.add_roles")
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"salon-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.position = 0
+        self.category = None
+        self._overwrites = {}
+
+    @property
+    def overwrites(self):
+        return dict(self._overwrites)
+
+    def overwrites_for(self, target):
+        overwrite = self._overwrites.get(target)
+        if overwrite is None:
+            return discord.PermissionOverwrite()
+        allow, deny = overwrite.pair()
+        return discord.PermissionOverwrite.from_pair(allow, deny)
+
+    async def send(self, *args, **kwargs):
+        await rest("channel.send")
+
+    async def set_permissions(self, target, *, overwrite=None, reason=None):
+        await rest("channel.set_permissions")
+        if overwrite is None:
+            self._overwrites.pop(target, None)
+        else:
+            self._overwrites[target] = overwrite
+
+    async def delete_messages(self, messages, **kwargs):
+        await rest("channel.delete_messages")
+
+    async def edit(self, **kwargs):
+        await rest("channel.edit")
+
+class FakeGuild:
+    def __init__(self, guild_id, channels=5):
+        self.id = guild_id
+        self.name = f"serveur-{guild_id}"
+        self.icon = None
+        self.default_role = FakeRole(guild_id, self)
+        self.text_channels = [FakeChannel(guild_id * 1000 + i, self) for i in range(channels)]
+        self.channels = list(self.text_channels)
+        self.roles = [self.default_role]
+
+    def get_channel(self, channel_id):
+        for channel in self.text_channels:
+            if channel.id == channel_id:
+                return channel
+        return None
+
+    def get_channel_or_thread(self, channel_id):
+        return self.get_channel(channel_id)
+
+    def get_role(self, role_id):
+        return self.default_role if role_id == self.default_role.id else None
+
+    async def ban(self, user, **kwargs):
+        await rest("guild.ban")
+
+class FakeMessage:
+    _next_id = 1
+
+    def __init__(self, author, channel, content, mentions=()):
+        FakeMessage._next_id += 1
+        self.id = FakeMessage._next_id
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.mentions = list(mentions)
+        self.role_mentions = []
+        self.mention_everyone = False
+        self.attachments = []
+        self.created_at = datetime.now(timezone.utc)
+
+    async def delete(self):
+        await rest("message.delete")
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+        await rest("interaction.response")
+
+    async def defer(self, **kwargs):
+        self.done = True
+        await rest("interaction.defer")
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        await rest("interaction.followup")
+
+class FakeInteraction:
+    def __init__(self, user, channel):
+        self.user = user
+        self.guild = channel.guild
+        self.channel = channel
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.extras = {}
+        self.command = None
+
+    async def edit_original_response(self, **kwargs):
+        await rest("interaction.edit")
+
+# SCÉNARIOS
+WORDS = ["bonjour", "salut", "merci", "jeu", "serveur", "discord", "demain", "soir", "match", "équipe",
+         "musique", "film", "question", "réponse", "idée", "projet", "photo", "lien", "vocal", "ok"]
+# Vocabulaire élargi : avec 20 mots seulement, des messages aléatoires se ressemblent trop
+WORDS += [f"{word}{i}" for i in range(25) for word in WORDS[:20]]
+
+def chat_text(rng, length=12):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, length)))
+
+def setup_guild(guild_id, channels=5, **settings):
+    guild = FakeGuild(guild_id, channels)
+    data = main.get_server_data(guild_id)
+    data.update(settings)
+    main.save_server_data(guild_id, data)
+    main.invalidate_word_matcher(guild_id)
+    return guild
+
+def scenario_chat(rng, count):
+    """Conversation normale : beaucoup d'auteurs, aucun déclenchement"""
+    guild = setup_guild(1)
+    # Le rejeu dure moins d'une fenêtre anti-spam : chaque auteur reste sous le seuil,
+    # quel que soit le nombre d'évènements (assez d'auteurs, chacun au plus max_messages fois)
+    per_member = main.get_server_data(1)["max_messages_per_minute"]
+    members = [FakeMember(10_000 + i, guild) for i in range(max(200, -(-count // per_member)))]
+    authors = [members[i % len(members)] for i in range(count)]
+    rng.shuffle(authors)
+    for author in authors:
+        yield "on_message", FakeMessage(author, rng.choice(guild.text_channels), chat_text(rng))
+
+def scenario_spam(rng, count):
+    """Rafales : quelques auteurs dépassent le seuil anti-spam"""
+    guild = setup_guild(2)
+    members = [FakeMember(20_000 + i, guild) for i in range(5)]
+    for _ in range(count):
+        yield "on_message", FakeMessage(rng.choice(members), guild.text_channels[0], chat_text(rng, 4))
+
+def scenario_banned_words(rng, count):
+    """Liste de 2000 mots bannis, 30 % des messages en contiennent un"""
+    banned = [f"interdit{i}" for i in range(2000)]
+    guild = setup_guild(3, banned_words=banned, max_messages_per_minute=10_000)
+    members = [FakeMember(30_000 + i, guild) for i in range(200)]
+    for _ in range(count):
+        text = chat_text(rng)
+        if rng.random() < 0.3:
+            text += " " + rng.choice(banned)
+        yield "on_message", FakeMessage(rng.choice(members), rng.choice(guild.text_channels), text)
+
+def scenario_join_flood(rng, count):
+    """Vague d'arrivées de comptes récents mais de plus de 7 jours"""
+    guild = setup_guild(4)
+    created = datetime.now(timezone.utc) - timedelta(days=30)
+    for i in range(count):
+        yield "on_member_join", FakeMember(40_000 + i, guild, created_at=created + timedelta(seconds=i))
+
+def scenario_admin(rng, count):
+    """Commandes d'administration : avertissements et mots bannis"""
+    guild = setup_guild(5)
+    admin = FakeMember(50_000, guild, administrator=True)
+    members = [FakeMember(50_001 + i, guild) for i in range(50)]
+    for i in range(count):
+        interaction = FakeInteraction(admin, guild.text_channels[0])
+        kind = i % 3
+        if kind == 0:
+            yield "command", (main.warn, interaction, rng.choice(members), "Benchmark")
+        elif kind == 1:
+            yield "command", (main.addword, interaction, f"mot{i}")
+        else:
+            yield "command", (main.removeword, interaction, f"mot{i - 1}")
+
+SCENARIOS = {
+    "chat": scenario_chat,
+    "spam": scenario_spam,
+    "banned_words": scenario_banned_words,
+    "join_flood": scenario_join_flood,
+    "admin": scenario_admin,
+}
+
+async def dispatch(kind, payload):
+    if kind == "on_message":
+        await main.on_message(payload)
+    elif kind == "on_member_join":
+        await main.on_member_join(payload)
+    else:
+        command, *args = payload
+        await command.callback(*args)
+
+async def settle():
+    """Attend la fin des tâches de fond et des actions de modération lancées par les gestionnaires"""
+    while True:
+        await main.REST_SCHEDULER.join()
+        if not main.BACKGROUND_TASKS:
+            break
+        await asyncio.gather(*list(main.BACKGROUND_TASKS), return_exceptions=True)
+        # Laisse les rappels de fin de tâche retirer les tâches terminées
+        await asyncio.sleep(0)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def run_scenario(name, count, seed):
+    rng = random.Random(seed)
+    events = list(SCENARIOS[name](rng, count))
+    await main.flush_server_data()
+    REST_CALLS.clear()
+    writes_before = main.SAVE_STATS["writes"]
+
+    latencies = []
+    started = time.perf_counter()
+    for kind, payload in events:
+        t0 = time.perf_counter()
+        await dispatch(kind, payload)
+        latencies.append(time.perf_counter() - t0)
+    await settle()
+    await main.flush_server_data()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "events": len(events),
+        "events_per_sec": len(events) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "disk_writes_per_event": (main.SAVE_STATS["writes"] - writes_before) / len(events),
+        "rest_calls": sum(REST_CALLS.values()),
+        "rest_calls_by_kind": dict(REST_CALLS),
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnue"
+
+def print_results(results, baseline=None):
+    header = f"{'scénario':<14} {'évts/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'écritures/évt':>14} {'REST':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<14} {r['events_per_sec']:>10.0f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+              f"{r['disk_writes_per_event']:>14.4f} {r['rest_calls']:>6}")
+        if baseline and name in baseline:
+            b = baseline[name]
+            print(f"{'  vs base':<14} {r['events_per_sec'] / b['events_per_sec'] - 1:>+10.1%} "
+                  f"{r['p50_ms'] / b['p50_ms'] - 1 if b['p50_ms'] else 0:>+8.1%} "
+                  f"{r['p99_ms'] / b['p99_ms'] - 1 if b['p99_ms'] else 0:>+8.1%} "
+                  f"{r['disk_writes_per_event'] - b['disk_writes_per_event']:>+14.4f} "
+                  f"{r['rest_calls'] - b['rest_calls']:>+6}")
+
+def regressions(results, baseline, tolerance):
+    """Scénarios dont le débit a baissé ou les appels REST/écritures ont augmenté"""
+    found = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        if r["events_per_sec"] < b["events_per_sec"] * (1 - tolerance):
+            found.append(f"{name}: débit {r['events_per_sec']:.0f} < {b['events_per_sec']:.0f} évts/s")
+        if r["rest_calls"] > b["rest_calls"]:
+            found.append(f"{name}: {r['rest_calls']} appels REST (base {b['rest_calls']})")
+        if r["disk_writes_per_event"] > b["disk_writes_per_event"]:
+            found.append(f"{name}: {r['disk_writes_per_event']:.4f} écritures/évt (base {b['disk_writes_per_event']:.4f})")
+    return found
+
+async def run(args):
+    # Pas de connexion Discord : pas de commandes préfixées ni de vrais canaux
+    main.bot.process_commands = lambda message: asyncio.sleep(0)
+    main.RAID_BATCH_DELAY = 0
+    main.RAID_COOLDOWN = 0.05
+    main.REST_SCHEDULER.start()
+    main.LOG_FLUSH_INTERVAL = 0
+    results = {}
+    for name in args.scenarios:
+        results[name] = await run_scenario(name, args.events, args.seed)
+    return results
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Banc d'essai hors ligne des gestionnaires du bot")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--events", type=int, default=5000, help="évènements par scénario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrire les résultats dans ce fichier")
+    parser.add_argument("--compare", help="comparer à un fichier de résultats précédent")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="baisse de débit tolérée avec --compare")
+    args = parser.parse_args()
+    # Chemins relatifs au dossier courant, résolus avant le passage dans le dossier temporaire
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    # Données des serveurs fictifs dans un dossier temporaire
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"revision": git_revision(), "events": args.events, "results": results}, f, indent=2)
+
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        for line in found:
+            print(f"⚠️ Régression: {line}")
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,19 +1,111 @@
 
 import os
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 from datetime import datetime, timedelta
 import json
 import asyncio
 import logging
+import argparse
+import bisect
+import copy
+import csv
+import functools
+import hashlib
+import io
+import math
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Configuration
+load_dotenv()
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Sharding : SHARD_COUNT > 0 active AutoShardedBot, SHARD_IDS limite ce processus à une partie des shards
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()] or None
+WORKER_ID = int(os.getenv("WORKER_ID", "0"))  # numéro du processus attribué par le lanceur
+
+class AstralCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction):
+        # Début de la mesure de latence de la commande (voir on_app_command_completion)
+        interaction.extras["started"] = time.perf_counter()
+        # Données du serveur chargées hors de la boucle avant la commande (qui les lit ensuite en cache)
+        if interaction.guild_id is not None and interaction.guild_id not in SERVER_DATA:
+            await fetch_server_data(interaction.guild_id)
+        return True
+
+    async def on_error(self, interaction, error):
+        record_command(interaction, error=True)
+        await super().on_error(interaction, error)
+
+class AstralBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    shutdown_task = None
+
+    async def setup_hook(self):
+        # SIGTERM (launcher, systemd, docker stop) : arrêt propre avec vidage des files et écriture des données
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: spawn(self.close()))
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows : pas de gestionnaire de signaux dans la boucle
+        save_loop.start()
+        sweep_loop.start()
+        if SHARD_COUNT:
+            shard_status_loop.start()
+        slowmode_loop.start()
+        REST_SCHEDULER.start()
+        # Les commandes sont globales : un seul processus du déploiement les synchronise
+        if WORKER_ID == 0:
+            await sync_command_tree()
+        if METRICS_PORT:
+            await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+    async def close(self):
+        # Un seul arrêt : un second appel (SIGTERM puis fin de bot.run) attend le premier
+        # au lieu de confier du travail au thread de stockage déjà arrêté
+        if self.shutdown_task is None:
+            self.shutdown_task = asyncio.ensure_future(self.shutdown())
+        await self.shutdown_task
+
+    async def shutdown(self):
+        # Dernières sanctions, derniers logs et dernière écriture des données avant l'arrêt
+        # (les logs passent par le planificateur REST : il est arrêté en dernier)
+        try:
+            await asyncio.wait_for(LOG_DISPATCHER.drain(), timeout=5)
+        except (asyncio.TimeoutError, discord.HTTPException):
+            pass
+        try:
+            await asyncio.wait_for(REST_SCHEDULER.drain(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+        save_loop.cancel()
+        await flush_server_data()
+        logging.info(f"💾 Sauvegardes: {SAVE_STATS} | Cache: {SERVER_DATA.stats()}")
+        await super().close()
+        # Dans le thread de stockage, après les écritures de serveurs évincés encore en file
+        await asyncio.get_running_loop().run_in_executor(STORAGE_EXECUTOR, STORAGE.close)
+        STORAGE_EXECUTOR.shutdown(wait=True)
+
+bot = AstralBot(
+    command_prefix='!',
+    intents=intents,
+    tree_cls=AstralCommandTree,
+    # Une attente de rate limit plus longue remonte en RateLimited au planificateur REST
+    max_ratelimit_timeout=10.0,
+    **({"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARD_COUNT else {})
+)
 
 # Crée le groupe de commandes 'admin' avec les permissions d'administrateur
 admin_group = app_commands.Group(
@@ -23,59 +115,495 @@ admin_group = app_commands.Group(
 )
 bot.tree.add_command(admin_group)
 
+# Le groupe 'admin' est plein (25 sous-commandes max) : réglages dans 'config'
+config_group = app_commands.Group(
+    name="config",
+    description="Réglages de la protection du serveur",
+    default_permissions=discord.Permissions(administrator=True)
+)
+bot.tree.add_command(config_group)
+
+ops_group = app_commands.Group(
+    name="ops",
+    description="Supervision et opérations du bot",
+    default_permissions=discord.Permissions(administrator=True)
+)
+bot.tree.add_command(ops_group)
+
 # Variables globales pour le cache
-SERVER_DATA = {}
+SERVER_CACHE_SIZE = int(os.getenv("SERVER_CACHE_SIZE", "1000"))  # serveurs gardés en mémoire
 
-def get_data_file(guild_id):
-    """Retourne le chemin du fichier de données pour un serveur"""
-    return f"configs/server_{guild_id}.json"
+# Écriture différée : les serveurs modifiés sont marqués puis écrits par lot
+SAVE_INTERVAL = 5  # secondes entre deux écritures groupées
+DIRTY_GUILDS = set()
+SAVE_LOCK = asyncio.Lock()
+SAVE_STATS = {"flushes": 0, "writes": 0, "coalesced": 0, "errors": 0}
 
-def load_server_data(guild_id):
-    """Charge les données d'un serveur depuis le fichier JSON"""
-    file_path = get_data_file(guild_id)
-    default_data = {
+# Stockage : "json" (un fichier par serveur, par défaut) ou "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "configs/astral.db")
+
+def default_server_data():
+    """Retourne les données par défaut d'un serveur"""
+    return {
         "log_channel_id": None,
         "maintenance_mode": False,
         "maintenance_reason": "",
-        "anti_spam": {},
         "warns": {},
+        "warn_decay_days": 0,
+        "warn_ban_threshold": 3,
         "automod_enabled": True,
         "raid_protection": True,
         "banned_words": ["spam", "hack", "scam"],
+        "word_filter_boundary": False,
+        "word_filter_confusables": False,
+        "word_filter_leet": False,
         "max_mentions": 5,
-        "max_messages_per_minute": 10
+        "max_mention_score": 15,
+        "mention_window": 60,
+        "mention_weight_user": 1,
+        "mention_weight_role": 3,
+        "mention_weight_everyone": 10,
+        "max_messages_per_minute": 10,
+        "spam_window_seconds": 60,
+        "spam_cleanup_seconds": 60,
+        "lockdown_snapshot": None,
+        "maintenance_snapshot": None,
+        "raid_join_threshold": 10,
+        "raid_join_window": 10,
+        "raid_account_span_hours": 0,
+        "raid_action": "ban",
+        "raid_quarantine_role_id": None,
+        "raid_auto_lockdown": False,
+        "flood_protection": True,
+        "flood_users": 5,
+        "flood_channels": 4,
+        "flood_window": 30,
+        "automod_exempt_roles": [],
+        "automod_exempt_channels": [],
+        "slowmode_auto": False,
+        "slowmode_high_rate": 2.0,
+        "slowmode_low_rate": 0.5,
+        "slowmode_delay": 5,
+        "slowmode_hold": 120,
+        "broadcast_channels": []
     }
-    
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # Mettre à jour avec les nouvelles clés si nécessaire
-                for key, value in default_data.items():
-                    if key not in data:
-                        data[key] = value
-                return data
-        except (json.JSONDecodeError, FileNotFoundError):
-            pass
-    
-    return default_data
 
-def save_server_data(guild_id, data):
-    """Sauvegarde les données d'un serveur dans le fichier JSON"""
-    file_path = get_data_file(guild_id)
+def apply_defaults(data):
+    """Complète les données chargées avec les nouvelles clés si nécessaire"""
+    # L'anti-spam est désormais en mémoire uniquement
+    data.pop("anti_spam", None)
+    for key, value in default_server_data().items():
+        if key not in data:
+            data[key] = value
+    # Chaque avertissement a un identifiant stable (utilisé par le stockage SQLite) et un horodatage
+    for warns in data["warns"].values():
+        for warn in warns:
+            if "id" not in warn:
+                warn["id"] = uuid.uuid4().hex
+            if warn.get("timestamp") is None:
+                warn["timestamp"] = parse_warn_date(warn.get("date"))
+    return data
+
+def parse_warn_date(date):
+    """Convertit l'ancienne date affichée (%d/%m/%Y %H:%M) en horodatage"""
+    try:
+        return datetime.strptime(date, "%d/%m/%Y %H:%M").timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+def get_data_file(guild_id):
+    """Retourne le chemin du fichier de données pour un serveur"""
+    return f"configs/server_{guild_id}.json"
+
+def write_file_atomic(file_path, content):
+    """Écrit un fichier de façon atomique (fichier temporaire puis renommage)"""
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+class JSONStorage:
+    """Stockage par défaut : un fichier JSON par serveur dans configs/"""
+
+    def load(self, guild_id):
+        """Charge les données d'un serveur, ou None si elles n'existent pas"""
+        file_path = get_data_file(guild_id)
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                pass
+        return None
+
+    def save(self, guild_id, data):
+        """Réécrit le fichier du serveur"""
+        content = json.dumps(data, indent=2, ensure_ascii=False, default=str)
+        write_file_atomic(get_data_file(guild_id), content)
+
+    def close(self):
+        pass
+
+class SQLiteStorage:
+    """Stockage SQLite (mode WAL) : réglages, mots bannis et avertissements en tables séparées.
+
+    Seules les lignes modifiées sont écrites : ajouter un avertissement insère
+    une ligne au lieu de réécrire tout le serveur.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS guild_settings (
+        guild_id INTEGER PRIMARY KEY,
+        settings TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS banned_words (
+        guild_id INTEGER NOT NULL,
+        word TEXT NOT NULL,
+        PRIMARY KEY (guild_id, word)
+    );
+    CREATE TABLE IF NOT EXISTS warns (
+        warn_id TEXT PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        reason TEXT,
+        moderator TEXT,
+        date TEXT,
+        timestamp REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_warns_guild_user ON warns (guild_id, user_id);
+    """
+
+    # Colonnes ajoutées après la création du schéma : (table, colonne, type)
+    MIGRATIONS = [("warns", "timestamp", "REAL")]
+
+    # Clés stockées dans leurs propres tables plutôt que dans guild_settings
+    TABLE_KEYS = ("banned_words", "warns")
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Plusieurs processus (mode shardé) peuvent écrire : attendre le verrou plutôt qu'échouer
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        # Connexion de lecture séparée : en WAL, une lecture n'attend jamais une écriture en cours
+        self.reader = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.read_lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        for table, column, column_type in self.MIGRATIONS:
+            columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        # Dernier état écrit par serveur, pour n'écrire que les différences
+        self.saved_words = {}
+        self.saved_warns = {}
+
+    def load(self, guild_id):
+        """Charge les données d'un serveur, ou None si elles n'existent pas"""
+        with self.read_lock:
+            row = self.reader.execute("SELECT settings FROM guild_settings WHERE guild_id = ?", (guild_id,)).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            words = [w for (w,) in self.reader.execute(
+                "SELECT word FROM banned_words WHERE guild_id = ? ORDER BY rowid", (guild_id,))]
+            warns = {}
+            for warn_id, user_id, reason, moderator, date, timestamp in self.reader.execute(
+                    "SELECT warn_id, user_id, reason, moderator, date, timestamp FROM warns WHERE guild_id = ? ORDER BY rowid",
+                    (guild_id,)):
+                warns.setdefault(str(user_id), []).append(
+                    {"id": warn_id, "reason": reason, "moderator": moderator, "date": date, "timestamp": timestamp})
+
+        data["banned_words"] = words
+        data["warns"] = warns
+        # saved_words/saved_warns appartiennent au thread de stockage : save() les initialise lui-même
+        return data
+
+    def save(self, guild_id, data):
+        """Écrit les réglages et uniquement les mots/avertissements ajoutés ou retirés"""
+        settings = {k: v for k, v in data.items() if k not in self.TABLE_KEYS}
+        words = data.get("banned_words", [])
+        warns = {w["id"]: (user_id, w) for user_id, user_warns in data.get("warns", {}).items() for w in user_warns}
+
+        with self.lock, self.conn:
+            if guild_id not in self.saved_words:
+                self.saved_words[guild_id] = {w for (w,) in self.conn.execute(
+                    "SELECT word FROM banned_words WHERE guild_id = ?", (guild_id,))}
+                self.saved_warns[guild_id] = {w for (w,) in self.conn.execute(
+                    "SELECT warn_id FROM warns WHERE guild_id = ?", (guild_id,))}
+            saved_words = self.saved_words[guild_id]
+            saved_warns = self.saved_warns[guild_id]
+
+            self.conn.execute(
+                "INSERT INTO guild_settings (guild_id, settings) VALUES (?, ?) "
+                "ON CONFLICT(guild_id) DO UPDATE SET settings = excluded.settings",
+                (guild_id, json.dumps(settings, ensure_ascii=False, default=str))
+            )
+            self.conn.executemany(
+                "DELETE FROM banned_words WHERE guild_id = ? AND word = ?",
+                [(guild_id, w) for w in saved_words - set(words)]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO banned_words (guild_id, word) VALUES (?, ?)",
+                [(guild_id, w) for w in words if w not in saved_words]
+            )
+            self.conn.executemany(
+                "DELETE FROM warns WHERE warn_id = ?",
+                [(warn_id,) for warn_id in saved_warns - warns.keys()]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO warns (warn_id, guild_id, user_id, reason, moderator, date, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(warn_id, guild_id, int(user_id), w.get("reason"), w.get("moderator"), w.get("date"), w.get("timestamp"))
+                 for warn_id, (user_id, w) in warns.items() if warn_id not in saved_warns]
+            )
+
+        self.saved_words[guild_id] = set(words)
+        self.saved_warns[guild_id] = set(warns)
+
+    def close(self):
+        with self.read_lock:
+            self.reader.close()
+        with self.lock:
+            # Reporte le journal WAL dans la base avant de fermer la dernière connexion
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+def create_storage(backend=STORAGE_BACKEND):
+    """Instancie le stockage configuré"""
+    if backend == "sqlite":
+        return SQLiteStorage(SQLITE_PATH)
+    return JSONStorage()
+
+STORAGE = create_storage()
+
+# Thread dédié aux accès disque, pour ne jamais bloquer la boucle d'évènements
+STORAGE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+
+def load_server_data(guild_id):
+    """Charge les données d'un serveur depuis le stockage"""
+    try:
+        data = STORAGE.load(guild_id)
+    except Exception as e:
+        logging.error(f"Erreur chargement serveur {guild_id}: {e}")
+        data = None
+    return apply_defaults(data if data is not None else default_server_data())
+
+def write_server_data(guild_id, data):
+    """Écrit immédiatement les données d'un serveur dans le stockage"""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        STORAGE.save(guild_id, data)
+        SAVE_STATS["writes"] += 1
+        return True
     except Exception as e:
+        SAVE_STATS["errors"] += 1
         logging.error(f"Erreur sauvegarde serveur {guild_id}: {e}")
+        return False
+
+class ServerDataCache:
+    """Cache LRU des données de serveurs.
+
+    Au-delà de `max_entries` serveurs, le moins récemment utilisé est évincé ;
+    ses modifications non écrites sont d'abord confiées au stockage. Les
+    serveurs épinglés (incident en cours) ne sont jamais évincés : chaque
+    épingle porte un motif (raid, verrouillage, maintenance) et le serveur
+    reste épinglé tant qu'un motif au moins est actif.
+    """
+
+    def __init__(self, max_entries, on_evict=None):
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.pins = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, guild_id):
+        return guild_id in self.entries
+
+    def __getitem__(self, guild_id):
+        return self.entries[guild_id]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, guild_id):
+        """Retourne les données en cache (ou None) et les marque comme récentes"""
+        data = self.entries.get(guild_id)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(guild_id)
+        return data
+
+    def put(self, guild_id, data):
+        """Ajoute ou remplace les données d'un serveur, puis évince si besoin"""
+        self.entries[guild_id] = data
+        self.entries.move_to_end(guild_id)
+        if len(self.entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        for guild_id in list(self.entries):
+            if len(self.entries) <= self.max_entries:
+                break
+            if guild_id in self.pins:
+                continue
+            data = self.entries.pop(guild_id)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(guild_id, data)
+
+    def pin(self, guild_id, reason):
+        """Empêche l'éviction d'un serveur (incident en cours) pour le motif donné"""
+        self.pins.setdefault(guild_id, set()).add(reason)
+
+    def unpin(self, guild_id, reason):
+        """Retire le motif ; le serveur redevient évinçable quand il n'en reste aucun"""
+        reasons = self.pins.get(guild_id)
+        if reasons is None:
+            return
+        reasons.discard(reason)
+        if not reasons:
+            del self.pins[guild_id]
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "pinned": len(self.pins),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+# Données des serveurs évincés dont l'écriture est en file : un rechargement repart de cette copie,
+# pas du stockage qui n'est peut-être pas encore à jour
+PENDING_WRITES = {}
+PENDING_WRITES_LOCK = threading.Lock()
+
+def write_evicted_server_data(guild_id, snapshot):
+    """Écrit un serveur évincé (thread de stockage) puis oublie sa copie en attente"""
+    if write_server_data(guild_id, snapshot):
+        with PENDING_WRITES_LOCK:
+            if PENDING_WRITES.get(guild_id) is snapshot:
+                del PENDING_WRITES[guild_id]
+
+def take_pending_write(guild_id):
+    """Copie de travail des données d'un serveur évincé dont l'écriture n'est pas confirmée (ou None)"""
+    with PENDING_WRITES_LOCK:
+        snapshot = PENDING_WRITES.get(guild_id)
+    if snapshot is None:
+        return None
+    # Réécrit après l'écriture en file (même thread, dans l'ordre) au cas où celle-ci échouerait
+    DIRTY_GUILDS.add(guild_id)
+    return copy.deepcopy(snapshot)
+
+def evict_server_data(guild_id, data):
+    """Écrit les modifications en attente d'un serveur évincé du cache"""
+    invalidate_word_matcher(guild_id)
+    WARN_LEDGERS.pop(guild_id, None)
+    MEMBER_EXEMPTIONS.invalidate_guild(guild_id)
+    LOG_DISPATCHER.invalidate_channel(guild_id)
+    if guild_id not in DIRTY_GUILDS:
+        return
+    DIRTY_GUILDS.discard(guild_id)
+    snapshot = copy.deepcopy(data)
+    with PENDING_WRITES_LOCK:
+        PENDING_WRITES[guild_id] = snapshot
+    try:
+        STORAGE_EXECUTOR.submit(write_evicted_server_data, guild_id, snapshot)
+    except RuntimeError:
+        # Thread de stockage déjà arrêté : écriture directe
+        write_evicted_server_data(guild_id, snapshot)
+
+SERVER_DATA = ServerDataCache(SERVER_CACHE_SIZE, on_evict=evict_server_data)
+
+def save_server_data(guild_id, data):
+    """Marque les données d'un serveur comme modifiées (écrites par save_loop)"""
+    SERVER_DATA.put(guild_id, data)
+    POLICIES.pop(guild_id, None)
+    if guild_id in DIRTY_GUILDS:
+        SAVE_STATS["coalesced"] += 1
+    else:
+        DIRTY_GUILDS.add(guild_id)
+
+async def flush_server_data(guild_id=None):
+    """Écrit les serveurs modifiés (tous, ou un seul si précisé)"""
+    async with SAVE_LOCK:
+        guild_ids = [guild_id] if guild_id is not None else list(DIRTY_GUILDS)
+        loop = asyncio.get_running_loop()
+        written = 0
+        for gid in guild_ids:
+            if gid not in DIRTY_GUILDS:
+                continue
+            DIRTY_GUILDS.discard(gid)
+            # La copie se fait dans la boucle pour figer l'état, l'écriture dans le thread de stockage
+            snapshot = copy.deepcopy(SERVER_DATA[gid])
+            if await loop.run_in_executor(STORAGE_EXECUTOR, write_server_data, gid, snapshot):
+                written += 1
+            else:
+                DIRTY_GUILDS.add(gid)
+        if written:
+            SAVE_STATS["flushes"] += 1
+        return written
+
+def flush_server_data_sync():
+    """Écrit de façon bloquante tous les serveurs modifiés (arrêt du bot)"""
+    for gid in list(DIRTY_GUILDS):
+        if write_server_data(gid, SERVER_DATA[gid]):
+            DIRTY_GUILDS.discard(gid)
+
+def pin_active_locks(guild_id, data):
+    """Épingle un serveur chargé dont un verrouillage est resté actif (redémarrage en plein incident)"""
+    for key in LOCK_SNAPSHOT_KEYS:
+        if data.get(key):
+            SERVER_DATA.pin(guild_id, key)
 
 def get_server_data(guild_id):
-    """Récupère les données d'un serveur (cache ou fichier)"""
-    if guild_id not in SERVER_DATA:
-        SERVER_DATA[guild_id] = load_server_data(guild_id)
-    return SERVER_DATA[guild_id]
+    """Récupère les données d'un serveur (cache ou stockage)"""
+    data = SERVER_DATA.get(guild_id)
+    if data is None:
+        data = take_pending_write(guild_id)
+        if data is None:
+            data = load_server_data(guild_id)
+            pin_active_locks(guild_id, data)
+        SERVER_DATA.put(guild_id, data)
+    return data
+
+async def fetch_server_data(guild_id):
+    """Comme get_server_data, mais un serveur absent du cache est lu dans le thread de stockage.
+
+    À appeler en tête des gestionnaires d'évènements : le reste du traitement
+    trouve ensuite le serveur en cache sans accès disque dans la boucle.
+    """
+    data = SERVER_DATA.get(guild_id)
+    if data is not None:
+        return data
+    if guild_id not in PENDING_WRITES:
+        loaded = await asyncio.get_running_loop().run_in_executor(STORAGE_EXECUTOR, load_server_data, guild_id)
+        # Chargé entre-temps par un autre gestionnaire (ou évincé avec des modifications) : sa version prime
+        if guild_id not in SERVER_DATA and guild_id not in PENDING_WRITES:
+            pin_active_locks(guild_id, loaded)
+            SERVER_DATA.put(guild_id, loaded)
+    return get_server_data(guild_id)
+
+async def preload_server_data(guild_ids):
+    """Charge en cache, depuis le thread de stockage, les serveurs pas encore chargés"""
+    loop = asyncio.get_running_loop()
+    # Inutile de précharger plus de serveurs que le cache n'en garde
+    for guild_id in guild_ids[:SERVER_DATA.max_entries]:
+        # Un serveur évincé en cours d'écriture sera repris de sa copie à la demande
+        if guild_id not in SERVER_DATA and guild_id not in PENDING_WRITES:
+            data = await loop.run_in_executor(STORAGE_EXECUTOR, load_server_data, guild_id)
+            if guild_id not in SERVER_DATA and guild_id not in PENDING_WRITES:
+                pin_active_locks(guild_id, data)
+                SERVER_DATA.put(guild_id, data)
 
 def update_server_data(guild_id, key, value):
     """Met à jour une donnée spécifique d'un serveur"""
@@ -83,239 +611,2499 @@ def update_server_data(guild_id, key, value):
     data[key] = value
     save_server_data(guild_id, data)
 
+def migrate_json_to_sqlite(source_dir="configs", db_path=SQLITE_PATH):
+    """Importe une fois pour toutes les fichiers configs/server_*.json dans SQLite"""
+    if not os.path.isdir(source_dir):
+        logging.info(f"ℹ️ Aucun dossier {source_dir} : rien à importer")
+        return 0
+    source = JSONStorage()
+    target = SQLiteStorage(db_path)
+    migrated = 0
+    try:
+        for file_name in sorted(os.listdir(source_dir)):
+            match = re.fullmatch(r"server_(\d+)\.json", file_name)
+            if not match:
+                continue
+            guild_id = int(match.group(1))
+            data = source.load(guild_id)
+            if data is None:
+                logging.warning(f"⚠️ Fichier illisible ignoré: {file_name}")
+                continue
+            target.save(guild_id, apply_defaults(data))
+            migrated += 1
+    finally:
+        target.close()
+    logging.info(f"✅ {migrated} serveurs importés dans {db_path}")
+    return migrated
+
+@tasks.loop(seconds=SAVE_INTERVAL)
+async def save_loop():
+    """Écrit périodiquement les serveurs modifiés"""
+    await flush_server_data()
+
+# LIMITATION DE DÉBIT
+class WindowEntry:
+    __slots__ = ("window", "slot", "counts", "total", "last_hit")
+
+    def __init__(self, window, slot, slots):
+        self.window = window
+        self.slot = slot
+        self.counts = [0] * slots
+        self.total = 0
+        self.last_hit = 0.0
+
+class SlidingWindowCounter:
+    """Compteur à fenêtre glissante par clé, sur horloge monotone.
+
+    Chaque clé possède un anneau de `slots` cases couvrant la fenêtre : un ajout
+    coûte O(1) et la mémoire par clé est fixe. Le nombre de clés est borné, les
+    moins récemment utilisées sont évincées en premier.
+    """
+
+    def __init__(self, slots=12, max_keys=50000):
+        self.slots = slots
+        self.max_keys = max_keys
+        self.entries = OrderedDict()
+
+    def hit(self, key, window, weight=1, now=None):
+        """Ajoute un évènement pour `key` et retourne le total sur la fenêtre"""
+        now = time.monotonic() if now is None else now
+        slot = int(now * self.slots / window)
+        entry = self.entries.get(key)
+        if entry is None or entry.window != window:
+            entry = WindowEntry(window, slot, self.slots)
+            self.entries[key] = entry
+            if len(self.entries) > self.max_keys:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+            self._advance(entry, slot)
+        entry.counts[slot % self.slots] += weight
+        entry.total += weight
+        entry.last_hit = now
+        return entry.total
+
+    def _advance(self, entry, slot):
+        """Vide les cases sorties de la fenêtre depuis le dernier ajout"""
+        if slot - entry.slot >= self.slots:
+            entry.counts = [0] * self.slots
+            entry.total = 0
+        else:
+            for s in range(entry.slot + 1, slot + 1):
+                index = s % self.slots
+                entry.total -= entry.counts[index]
+                entry.counts[index] = 0
+        entry.slot = slot
+
+    def reset(self, key):
+        """Oublie le compteur d'une clé"""
+        self.entries.pop(key, None)
+
+    def sweep(self, now=None):
+        """Supprime les clés inactives depuis plus d'une fenêtre"""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        while self.entries:
+            entry = next(iter(self.entries.values()))
+            if now - entry.last_hit < entry.window:
+                break
+            self.entries.popitem(last=False)
+            removed += 1
+        return removed
+
+SPAM_COUNTER = SlidingWindowCounter()
+# Mentions pondérées par membre sur plusieurs messages (en mémoire uniquement)
+MENTION_COUNTER = SlidingWindowCounter()
+
+class TTLCache:
+    """Ensemble de clés qui expirent après `ttl` secondes (taille bornée, plus anciennes évincées)"""
+
+    def __init__(self, ttl, max_keys=50000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.entries = OrderedDict()
+
+    def add(self, key, now=None, ttl=None):
+        """Ajoute la clé ; retourne False si elle était déjà présente et non expirée"""
+        now = time.monotonic() if now is None else now
+        expires = self.entries.get(key)
+        if expires is not None and expires > now:
+            return False
+        self.entries[key] = now + (self.ttl if ttl is None else ttl)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+        return True
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def discard_where(self, predicate):
+        for key in [key for key in self.entries if predicate(key)]:
+            del self.entries[key]
+
+    def sweep(self, now=None):
+        """Supprime les clés expirées"""
+        now = time.monotonic() if now is None else now
+        expired = [key for key, expires in self.entries.items() if expires <= now]
+        for key in expired:
+            del self.entries[key]
+        return len(expired)
+
+# Membres déjà prévenus de la maintenance : un seul MP par membre et par maintenance
+MAINTENANCE_DM_TTL = 6 * 3600
+MAINTENANCE_NOTIFIED = TTLCache(MAINTENANCE_DM_TTL)
+
+# FILTRAGE DES MOTS BANNIS
+LEET_TABLE = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t"
+})
+
+# Caractères cyrilliques et grecs visuellement identiques à des lettres latines
+CONFUSABLES_TABLE = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "з": "3", "і": "i", "ј": "j", "к": "k",
+    "м": "m", "н": "h", "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x",
+    "ѕ": "s", "ԁ": "d", "ԛ": "q", "ԝ": "w",
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o",
+    "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ω": "w"
+})
+
+# Blocs Unicode des diacritiques combinants (accents séparés de leur lettre par NFKD)
+COMBINING_RE = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]")
+
+def normalize_text(text, confusables=False, leet=False):
+    """Normalise un texte pour la recherche de mots bannis"""
+    text = text.casefold()
+    # Les tables ne concernent que des caractères non ASCII
+    if confusables and not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = COMBINING_RE.sub("", text)
+        text = text.translate(CONFUSABLES_TABLE)
+    if leet:
+        text = text.translate(LEET_TABLE)
+    return text
+
+class BannedWordMatcher:
+    """Automate d'Aho-Corasick : cherche tous les mots bannis en une seule passe"""
+
+    # En dessous de ce nombre de mots, `in` (en C) reste plus rapide que l'automate
+    SMALL_LIST = 200
+
+    def __init__(self, words, word_boundary=False, confusables=False, leet=False):
+        self.word_boundary = word_boundary
+        self.confusables = confusables
+        self.leet = leet
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        self.patterns = []
+        for word in words:
+            pattern = normalize_text(word, confusables, leet)
+            if pattern:
+                self.patterns.append((pattern, word))
+                self._insert(pattern, word)
+        self._build_links()
+        self.small = len(self.patterns) <= self.SMALL_LIST and not word_boundary
+
+    def _insert(self, pattern, word):
+        node = 0
+        for ch in pattern:
+            next_node = self.goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][ch] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = next_node
+        self.output[node].append((len(pattern), word))
+
+    def _build_links(self):
+        """Calcule les liens d'échec en largeur d'abord"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """Retourne le premier mot banni trouvé dans le texte, ou None"""
+        if not self.patterns:
+            return None
+        text = normalize_text(text, self.confusables, self.leet)
+        if self.small:
+            for pattern, word in self.patterns:
+                if pattern in text:
+                    return word
+            return None
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, word in output[node]:
+                if not self.word_boundary or self._is_word(text, i + 1 - length, i + 1):
+                    return word
+        return None
+
+    @staticmethod
+    def _is_word(text, start, end):
+        """Vérifie que la correspondance n'est pas collée à d'autres lettres"""
+        return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+# Automates compilés par serveur, reconstruits à la demande après modification
+WORD_MATCHERS = {}
+
+def get_word_matcher(guild_id, data):
+    """Retourne l'automate des mots bannis d'un serveur (compilé si besoin)"""
+    matcher = WORD_MATCHERS.get(guild_id)
+    if matcher is None:
+        matcher = BannedWordMatcher(
+            data["banned_words"],
+            word_boundary=data["word_filter_boundary"],
+            confusables=data["word_filter_confusables"],
+            leet=data["word_filter_leet"]
+        )
+        WORD_MATCHERS[guild_id] = matcher
+    return matcher
+
+def invalidate_word_matcher(guild_id):
+    """Force la recompilation de l'automate au prochain message"""
+    WORD_MATCHERS.pop(guild_id, None)
+    POLICIES.pop(guild_id, None)
+
+# POLITIQUE D'AUTOMODÉRATION
+# Réglages d'un serveur compilés pour on_message ; reconstruits après chaque modification des données
+AutomodPolicy = namedtuple("AutomodPolicy", [
+    "data", "maintenance", "maintenance_reason", "automod", "word_matcher",
+    "flood", "flood_window", "flood_users", "flood_channels",
+    "max_messages", "spam_window", "max_mentions", "cleanup_seconds",
+    "max_mention_score", "mention_window", "mention_weights",
+    "exempt_roles", "exempt_channels",
+    "slowmode", "slowmode_high_rate", "slowmode_low_rate", "slowmode_delay", "slowmode_hold"
+])
+
+POLICIES = {}
+
+def compile_policy(guild_id, data):
+    return AutomodPolicy(
+        data=data,
+        maintenance=data["maintenance_mode"],
+        maintenance_reason=data["maintenance_reason"],
+        automod=data["automod_enabled"],
+        word_matcher=get_word_matcher(guild_id, data),
+        flood=data["flood_protection"],
+        flood_window=data["flood_window"],
+        flood_users=data["flood_users"],
+        flood_channels=data["flood_channels"],
+        max_messages=data["max_messages_per_minute"],
+        spam_window=data["spam_window_seconds"],
+        max_mentions=data["max_mentions"],
+        max_mention_score=data["max_mention_score"],
+        mention_window=data["mention_window"],
+        mention_weights=(data["mention_weight_user"], data["mention_weight_role"], data["mention_weight_everyone"]),
+        cleanup_seconds=data["spam_cleanup_seconds"],
+        exempt_roles=frozenset(data["automod_exempt_roles"]),
+        exempt_channels=frozenset(data["automod_exempt_channels"]),
+        slowmode=data["slowmode_auto"],
+        slowmode_high_rate=data["slowmode_high_rate"],
+        slowmode_low_rate=data["slowmode_low_rate"],
+        slowmode_delay=data["slowmode_delay"],
+        slowmode_hold=data["slowmode_hold"]
+    )
+
+def get_policy(guild_id):
+    """Retourne la politique compilée d'un serveur (reconstruite si ses données ont changé)"""
+    data = get_server_data(guild_id)
+    policy = POLICIES.get(guild_id)
+    if policy is None or policy.data is not data:
+        policy = POLICIES[guild_id] = compile_policy(guild_id, data)
+    return policy
+
+EXEMPTION_TTL = 300  # secondes ; sans l'intent members, les changements de rôles ne sont pas notifiés
+
+class MemberExemptions:
+    """Cache par serveur du statut (administrateur, exempté) des membres.
+
+    Calculer guild_permissions parcourt tous les rôles du membre : le résultat
+    est gardé EXEMPTION_TTL secondes, et oublié dès qu'un rôle du membre ou les
+    permissions d'un rôle du serveur changent.
+    """
+
+    def __init__(self, max_per_guild=10000):
+        self.max_per_guild = max_per_guild
+        self.guilds = {}
+
+    def get(self, member, policy, now=None):
+        now = time.monotonic() if now is None else now
+        roles, cache = self.guilds.get(member.guild.id, (None, None))
+        if cache is None or roles != policy.exempt_roles:
+            # Premier membre vu, ou rôles exemptés modifiés depuis : tout est recalculé
+            cache = {}
+            self.guilds[member.guild.id] = (policy.exempt_roles, cache)
+        entry = cache.get(member.id)
+        if entry is not None and entry[2] > now:
+            return entry[0], entry[1]
+        admin = member.guild_permissions.administrator
+        exempt = admin or any(role.id in policy.exempt_roles for role in member.roles)
+        if len(cache) >= self.max_per_guild:
+            cache.clear()
+        cache[member.id] = (admin, exempt, now + EXEMPTION_TTL)
+        return admin, exempt
+
+    def invalidate_member(self, guild_id, member_id):
+        _, cache = self.guilds.get(guild_id, (None, {}))
+        cache.pop(member_id, None)
+
+    def invalidate_guild(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+MEMBER_EXEMPTIONS = MemberExemptions()
+
+@tasks.loop(seconds=60)
+async def sweep_loop():
+    """Nettoie périodiquement les compteurs inactifs"""
+    SPAM_COUNTER.sweep()
+    MENTION_COUNTER.sweep()
+    MAINTENANCE_NOTIFIED.sweep()
+    REST_SCHEDULER.recent.sweep()
+
+# MÉTRIQUES
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = endpoint /metrics désactivé
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Histogramme à seuils fixes (format Prometheus)"""
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estime un quantile par interpolation linéaire dans le seuil concerné"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= target and bucket_count:
+                if index == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                return lower + (LATENCY_BUCKETS[index] - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return LATENCY_BUCKETS[-1]
+
+class StageTimer:
+    """Mesure la durée d'un bloc `with` et l'enregistre dans un histogramme"""
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.metrics.inc(self.name.replace("_seconds", "_errors_total"), **self.labels)
+        return False
+
+class Metrics:
+    """Compteurs et histogrammes en mémoire, exportés au format texte Prometheus"""
+
+    def __init__(self, prefix="astral"):
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(labels.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def time(self, name, **labels):
+        return StageTimer(self, name, labels)
+
+    def gauge(self, name, collect):
+        """Déclare une jauge calculée à l'export ; collect() retourne {labels: valeur} ou une valeur"""
+        self.gauges[name] = collect
+
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, tuple(labels.items())))
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(labels.items())), 0)
+
+    @staticmethod
+    def _escape(value):
+        """Échappe une valeur d'étiquette (\\, " et retours à la ligne) selon le format d'exposition"""
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @classmethod
+    def _labels(cls, labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{cls._escape(v)}"' for k, v in items) + "}"
+
+    def render(self):
+        """Retourne toutes les métriques au format d'exposition texte Prometheus"""
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            for (metric, labels), value in self.counters.items():
+                if metric == name:
+                    lines.append(f"{self.prefix}_{name}{self._labels(labels)} {value}")
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {self.prefix}_{name} histogram")
+            for (metric, labels), histogram in self.histograms.items():
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{self.prefix}_{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.prefix}_{name}_sum{self._labels(labels)} {histogram.sum}")
+                lines.append(f"{self.prefix}_{name}_count{self._labels(labels)} {histogram.count}")
+        for name, collect in sorted(self.gauges.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                logging.error(f"Erreur métrique {name}: {e}")
+                continue
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            if not isinstance(values, dict):
+                values = {(): values}
+            for labels, value in values.items():
+                lines.append(f"{self.prefix}_{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+def instrumented(func):
+    """Mesure la durée et les erreurs d'un gestionnaire d'évènement"""
+    event = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with METRICS.time("event_seconds", event=event):
+            return await func(*args, **kwargs)
+    return wrapper
+
+def record_command(interaction, error=False):
+    """Enregistre la durée (et l'éventuelle erreur) d'une commande slash"""
+    started = interaction.extras.get("started")
+    command = interaction.command.qualified_name if interaction.command else "inconnue"
+    if started is not None:
+        METRICS.observe("command_seconds", time.perf_counter() - started, command=command)
+    if error:
+        METRICS.inc("command_errors_total", command=command)
+
+async def handle_metrics_request(reader, writer):
+    """Répond aux requêtes HTTP GET /metrics"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", METRICS.render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(host, port):
+    """Démarre l'endpoint local des métriques"""
+    server = await asyncio.start_server(handle_metrics_request, host, port)
+    logging.info(f"📈 Métriques disponibles sur http://{host}:{port}/metrics")
+    return server
+
+# Références des tâches de fond (sinon elles peuvent être ramassées en cours d'exécution)
+BACKGROUND_TASKS = set()
+
+def spawn(coro):
+    """Lance une coroutine en tâche de fond"""
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+# PLANIFICATEUR REST
+REST_LANES = ("critical", "delete", "log", "announce")  # voies, par priorité décroissante
+ACTION_LANES = {
+    "ban": "critical", "kick": "critical", "timeout": "critical", "role": "critical",
+    "permissions": "critical", "slowmode": "critical",
+    "delete": "delete", "channel": "delete",
+    "log": "log",
+    "dm": "announce", "notice": "announce", "announce": "announce"
+}
+REST_MAX_IN_FLIGHT = 8  # appels REST simultanés, toutes voies confondues
+REST_ROUTE_CONCURRENCY = 2  # appels simultanés sur une même route (bucket de rate limit)
+REST_QUEUE_SIZE = 10000  # au-delà, seules les sanctions sont encore acceptées
+REST_SHED_BACKLOG = 500  # au-delà, les annonces ne sont plus acceptées
+REST_MAX_WAIT = {"log": 300, "announce": 60}  # secondes d'attente avant abandon
+REST_SCAN_DEPTH = 50  # travaux examinés par voie pour trouver une route libre
+REST_MAX_RETRIES = 3  # nouvelles tentatives d'un appel limité (429)
+
+class RequestShed(Exception):
+    """Appel abandonné par le planificateur (surcharge ou attente trop longue)"""
+
+class RestJob:
+    __slots__ = ("kind", "lane", "route", "action", "future", "queued_at", "retries", "key")
+
+    def __init__(self, kind, route, action, future=None, key=None):
+        self.kind = kind
+        self.lane = ACTION_LANES[kind]
+        self.route = route
+        self.action = action
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.retries = 0
+        self.key = key  # clé de regroupement, libérée si le travail est abandonné
+
+class RestScheduler:
+    """Passage obligé des appels REST du bot, répartis en voies de priorité.
+
+    Au plus `max_in_flight` appels en cours, dont `route_concurrency` par route
+    (les suppressions d'un canal, les bans d'un serveur...) : une route saturée
+    ne bloque pas les autres. Les sanctions passent toujours en premier ; en
+    cas de retard, les annonces sont refusées, et logs et annonces abandonnés
+    s'ils ont attendu plus de REST_MAX_WAIT. Une route limitée par Discord (429)
+    est mise en pause le temps indiqué et l'appel repart en tête de sa voie.
+    Avec `window`, une même action contre une même cible n'est exécutée
+    qu'une fois par fenêtre d'incident.
+    """
+
+    def __init__(self, max_in_flight=REST_MAX_IN_FLIGHT, route_concurrency=REST_ROUTE_CONCURRENCY, maxsize=REST_QUEUE_SIZE):
+        self.max_in_flight = max_in_flight
+        self.route_concurrency = route_concurrency
+        self.maxsize = maxsize
+        self.lanes = {lane: deque() for lane in REST_LANES}
+        self.size = 0
+        self.in_flight = 0
+        self.routes = {}  # route → appels en cours
+        self.cooldowns = {}  # route → fin de la pause (horloge monotone)
+        self.running = set()
+        self.wakeup = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.task = None
+        self.recent = TTLCache(ttl=60)
+        self.stats = {"queued": 0, "done": 0, "coalesced": 0, "shed": 0, "ratelimited": 0, "errors": 0}
+
+    def start(self):
+        self.task = asyncio.create_task(self._dispatch())
+
+    def submit(self, kind, guild_id, target_id, action, window=None, incident=None, route=None):
+        """Ajoute `action` (fonction sans argument retournant la coroutine à exécuter).
+
+        `route` identifie le bucket visé (par défaut le type d'action dans le serveur).
+        Retourne False si l'action a été regroupée avec une action identique
+        récente ou refusée pour cause de surcharge.
+        """
+        key = (kind, incident, guild_id, target_id) if window else None
+        if key and not self.recent.add(key, ttl=window):
+            self.stats["coalesced"] += 1
+            return False
+        return self._enqueue(RestJob(kind, route or (kind, guild_id), action, key=key))
+
+    async def call(self, kind, route, action):
+        """Exécute `action` à son tour et retourne son résultat.
+
+        Lève l'exception de l'appel, ou RequestShed s'il a été abandonné.
+        """
+        job = RestJob(kind, route, action, asyncio.get_running_loop().create_future())
+        self._enqueue(job)
+        return await job.future
+
+    async def join(self):
+        """Attend que toutes les voies soient vides et les appels en cours terminés"""
+        await self.idle.wait()
+
+    async def drain(self):
+        """Exécute ce qui est en file puis arrête le planificateur"""
+        if self.task:
+            await self.join()
+            self.task.cancel()
+            self.task = None
+
+    def _enqueue(self, job):
+        if job.lane != "critical" and (self.size >= self.maxsize or (job.lane == "announce" and self.size >= REST_SHED_BACKLOG)):
+            self._shed(job)
+            return False
+        self.lanes[job.lane].append(job)
+        self.size += 1
+        self.stats["queued"] += 1
+        self.idle.clear()
+        self.wakeup.set()
+        return True
+
+    def _shed(self, job):
+        # Une sanction abandonnée ne doit pas bloquer sa prochaine tentative
+        if job.key is not None:
+            self.recent.discard(job.key)
+        self.stats["shed"] += 1
+        METRICS.inc("rest_shed_total", lane=job.lane)
+        if job.future is not None and not job.future.done():
+            job.future.set_exception(RequestShed(job.kind))
+
+    def _next_job(self, now):
+        """Retire le travail le plus prioritaire dont la route est libre (None sinon)"""
+        for lane in REST_LANES:
+            queue = self.lanes[lane]
+            max_wait = REST_MAX_WAIT.get(lane)
+            while max_wait and queue and now - queue[0].queued_at > max_wait:
+                self.size -= 1
+                self._shed(queue.popleft())
+            for index in range(min(len(queue), REST_SCAN_DEPTH)):
+                job = queue[index]
+                if self.routes.get(job.route, 0) < self.route_concurrency and self.cooldowns.get(job.route, 0) <= now:
+                    del queue[index]
+                    self.size -= 1
+                    return job
+        return None
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            while self.in_flight < self.max_in_flight:
+                job = self._next_job(now)
+                if job is None:
+                    break
+                self._launch(job, now)
+            self._update_idle()
+            self.wakeup.clear()
+            # Réveil au prochain ajout, à la fin d'un appel ou à la fin de la pause d'une route
+            timeout = None
+            if self.cooldowns:
+                self.cooldowns = {route: until for route, until in self.cooldowns.items() if until > now}
+                if self.cooldowns and self.size:
+                    timeout = min(self.cooldowns.values()) - now
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _launch(self, job, now):
+        self.in_flight += 1
+        self.routes[job.route] = self.routes.get(job.route, 0) + 1
+        METRICS.observe("rest_wait_seconds", now - job.queued_at, lane=job.lane)
+        task = asyncio.create_task(self._execute(job))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def _execute(self, job):
+        started = time.perf_counter()
+        try:
+            if job.future is not None and job.future.done():
+                return  # appelant annulé entre-temps
+            result = await job.action()
+        except discord.RateLimited as e:
+            self.stats["ratelimited"] += 1
+            METRICS.inc("rest_ratelimited_total", lane=job.lane)
+            self.cooldowns[job.route] = time.monotonic() + e.retry_after
+            if job.retries < REST_MAX_RETRIES:
+                job.retries += 1
+                self.lanes[job.lane].appendleft(job)
+                self.size += 1
+            else:
+                self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.stats["done"] += 1
+            if job.future is not None and not job.future.done():
+                job.future.set_result(result)
+        finally:
+            METRICS.observe("rest_call_seconds", time.perf_counter() - started, action=job.kind)
+            self.in_flight -= 1
+            count = self.routes.pop(job.route) - 1
+            if count:
+                self.routes[job.route] = count
+            self._update_idle()
+            self.wakeup.set()
+
+    def _fail(self, job, error):
+        self.stats["errors"] += 1
+        METRICS.inc("rest_errors_total", action=job.kind)
+        if job.future is not None:
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            logging.debug(f"Action {job.kind} échouée: {error}")
+
+    def _update_idle(self):
+        if self.size == 0 and self.in_flight == 0:
+            self.idle.set()
+        else:
+            self.idle.clear()
+
+REST_SCHEDULER = RestScheduler()
+
+# NETTOYAGE DES MESSAGES RÉCENTS
+RECENT_PER_CHANNEL = 100  # messages gardés par canal
+RECENT_CHANNELS_PER_GUILD = 50  # canaux suivis par serveur (les moins actifs sont oubliés)
+BULK_DELETE_SIZE = 100  # maximum accepté par l'endpoint de suppression groupée
+
+class RecentMessages:
+    """Derniers messages (id, auteur, heure) de chaque canal, dans des anneaux de taille fixe.
+
+    La mémoire est bornée : RECENT_PER_CHANNEL messages par canal, au plus
+    RECENT_CHANNELS_PER_GUILD canaux par serveur et `max_guilds` serveurs.
+    """
+
+    def __init__(self, max_guilds):
+        self.max_guilds = max_guilds
+        self.guilds = OrderedDict()
+
+    def record(self, message, now=None):
+        now = time.monotonic() if now is None else now
+        channels = self.guilds.get(message.guild.id)
+        if channels is None:
+            channels = self.guilds[message.guild.id] = OrderedDict()
+            if len(self.guilds) > self.max_guilds:
+                self.guilds.popitem(last=False)
+        else:
+            self.guilds.move_to_end(message.guild.id)
+        ring = channels.get(message.channel.id)
+        if ring is None:
+            ring = channels[message.channel.id] = deque(maxlen=RECENT_PER_CHANNEL)
+            if len(channels) > RECENT_CHANNELS_PER_GUILD:
+                channels.popitem(last=False)
+        else:
+            channels.move_to_end(message.channel.id)
+        ring.append((message.id, message.author.id, now))
+
+    def take(self, guild_id, user_id, seconds, now=None):
+        """Retire et retourne {canal: [ids]} des messages de `user_id` des `seconds` dernières secondes"""
+        now = time.monotonic() if now is None else now
+        cutoff = now - seconds
+        found = {}
+        for channel_id, ring in self.guilds.get(guild_id, {}).items():
+            ids = []
+            for message_id, author_id, at in reversed(ring):
+                if at < cutoff:
+                    break
+                if author_id == user_id:
+                    ids.append(message_id)
+            if ids:
+                taken = set(ids)
+                kept = [entry for entry in ring if entry[0] not in taken]
+                ring.clear()
+                ring.extend(kept)
+                found[channel_id] = ids
+        return found
+
+    def forget_channel(self, guild_id, channel_id):
+        self.guilds.get(guild_id, {}).pop(channel_id, None)
+
+RECENT_MESSAGES = RecentMessages(SERVER_CACHE_SIZE)
+
+# Nettoyages en file, par (serveur, membre) : les messages arrivés entre-temps sont inclus au passage
+CLEANUP_PENDING = set()
+
+def schedule_cleanup(guild, user_id, seconds):
+    """Planifie la suppression groupée des messages récents d'un membre signalé"""
+    key = (guild.id, user_id)
+    if seconds <= 0 or key in CLEANUP_PENDING:
+        return
+    CLEANUP_PENDING.add(key)
+
+    async def cleanup():
+        CLEANUP_PENDING.discard(key)
+        delete_recent_messages(guild, user_id, seconds)
+
+    REST_SCHEDULER.submit("delete", guild.id, user_id, cleanup)
+
+def delete_recent_messages(guild, user_id, seconds):
+    """Planifie la suppression des messages récents d'un membre : un travail par lot de 100 et par canal.
+
+    Chaque lot passe par la route du canal, soumis aux limites du planificateur REST
+    comme n'importe quelle autre suppression. Retourne le nombre de lots planifiés.
+    """
+    scheduled = 0
+    for channel_id, message_ids in RECENT_MESSAGES.take(guild.id, user_id, seconds).items():
+        # Les messages postés dans des fils sont enregistrés sous l'identifiant du fil
+        channel = guild.get_channel_or_thread(channel_id)
+        if channel is None:
+            continue
+        for start in range(0, len(message_ids), BULK_DELETE_SIZE):
+            batch = [discord.Object(id=message_id) for message_id in message_ids[start:start + BULK_DELETE_SIZE]]
+            if REST_SCHEDULER.submit("delete", guild.id, channel.id, cleanup_batch(channel, batch), route=("delete", channel.id)):
+                scheduled += 1
+    return scheduled
+
+def cleanup_batch(channel, batch):
+    async def delete():
+        try:
+            await channel.delete_messages(batch, reason="Nettoyage anti-spam")
+            METRICS.inc("cleanup_deleted_messages_total", len(batch))
+        except discord.HTTPException as e:
+            logging.debug(f"Nettoyage {channel.id} échoué: {e}")
+    return delete
+
+# JOURNALISATION
+LOG_BATCH_SIZE = 10  # embeds max par message Discord
+EMBED_TOTAL_LIMIT = 6000  # caractères max pour l'ensemble des embeds d'un message
+LOG_FLUSH_INTERVAL = 2.0  # secondes d'attente max avant l'envoi d'un lot incomplet
+LOG_MAX_PENDING = 200  # au-delà, les nouveaux logs sont comptés puis résumés
+
+def pack_embeds(embeds, max_count=LOG_BATCH_SIZE):
+    """Découpe une liste d'embeds en lots envoyables en un seul message"""
+    batches, batch, size = [], [], 0
+    for embed in embeds:
+        length = len(embed)
+        if batch and (len(batch) >= max_count or size + length > EMBED_TOTAL_LIMIT):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(embed)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+class LogDispatcher:
+    """File de logs par serveur.
+
+    Les embeds en attente sont regroupés en messages de 10 embeds au plus,
+    envoyés dès qu'un lot est plein ou après LOG_FLUSH_INTERVAL. En cas de
+    surcharge, les logs en trop sont remplacés par un embed de résumé.
+    Le canal de logs est résolu une fois puis gardé en cache ; un canal
+    configuré mais absent du cache de la gateway est récupéré par l'API au
+    moment de l'envoi, et de nouveau au lot suivant si cela échoue.
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.events = {}
+        self.workers = {}
+        self.dropped = {}
+        self.channels = {}
+        self.stats = {"queued": 0, "messages": 0, "embeds": 0, "dropped": 0, "errors": 0}
+
+    def get_channel(self, guild_id):
+        """Retourne le canal de logs du serveur (ou None), depuis le cache"""
+        if guild_id in self.channels:
+            return self.channels[guild_id]
+        channel_id = get_server_data(guild_id)["log_channel_id"]
+        channel = bot.get_channel(channel_id) if channel_id else None
+        # Canal configuré mais pas encore dans le cache de la gateway (démarrage...) : pas mémorisé
+        if channel is not None or not channel_id:
+            self.channels[guild_id] = channel
+        return channel
+
+    async def resolve_channel(self, guild_id):
+        """Comme get_channel, mais un canal absent du cache est récupéré par l'API"""
+        channel = self.get_channel(guild_id)
+        channel_id = get_server_data(guild_id)["log_channel_id"]
+        if channel is not None or not channel_id:
+            return channel
+        try:
+            channel = await REST_SCHEDULER.call("log", ("channel", channel_id), lambda: bot.fetch_channel(channel_id))
+        except discord.NotFound:
+            # Canal supprimé : plus de logs jusqu'à la prochaine configuration
+            self.channels[guild_id] = None
+            return None
+        except (discord.HTTPException, RequestShed) as e:
+            logging.error(f"Erreur récupération canal de logs serveur {guild_id}: {e}")
+            return None
+        self.channels[guild_id] = channel
+        return channel
+
+    def invalidate_channel(self, guild_id):
+        """Oublie le canal en cache (canal de logs modifié ou supprimé)"""
+        self.channels.pop(guild_id, None)
+
+    def enqueue(self, guild_id, embed):
+        """Ajoute un embed à la file du serveur ; retourne False sans canal de logs"""
+        if self.get_channel(guild_id) is None and not get_server_data(guild_id)["log_channel_id"]:
+            return False
+
+        queue = self.queues.setdefault(guild_id, deque())
+        if len(queue) >= LOG_MAX_PENDING:
+            self.dropped[guild_id] = self.dropped.get(guild_id, 0) + 1
+            self.stats["dropped"] += 1
+        else:
+            queue.append(embed)
+            self.stats["queued"] += 1
+
+        if guild_id not in self.workers:
+            self.events[guild_id] = asyncio.Event()
+            self.workers[guild_id] = spawn(self._run(guild_id))
+        elif len(queue) >= LOG_BATCH_SIZE:
+            self.events[guild_id].set()
+        return True
+
+    async def _run(self, guild_id):
+        queue = self.queues[guild_id]
+        event = self.events[guild_id]
+        try:
+            while queue or self.dropped.get(guild_id):
+                if len(queue) < LOG_BATCH_SIZE:
+                    event.clear()
+                    try:
+                        await asyncio.wait_for(event.wait(), LOG_FLUSH_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                await self._send_batch(guild_id, queue)
+        finally:
+            self.workers.pop(guild_id, None)
+            self.events.pop(guild_id, None)
+
+    async def _send_batch(self, guild_id, queue):
+        """Envoie un message contenant le plus possible d'embeds en attente"""
+        channel = await self.resolve_channel(guild_id)
+        dropped = self.dropped.pop(guild_id, 0)
+        if channel is None:
+            # Canal introuvable pour l'instant : ce lot est perdu, le suivant refera la recherche
+            self.stats["dropped"] += len(queue)
+            queue.clear()
+            return
+
+        embeds = []
+        if dropped:
+            embeds.append(discord.Embed(
+                title="⚠️ Logs ignorés",
+                description=f"{dropped} évènements non journalisés (surcharge)",
+                color=0xffa500
+            ))
+        while queue and len(embeds) < LOG_BATCH_SIZE:
+            embeds.append(queue.popleft())
+
+        batches = pack_embeds(embeds)
+        # Ce qui ne tient pas dans un message repart en tête de file
+        for embed in reversed([e for batch in batches[1:] for e in batch]):
+            queue.appendleft(embed)
+
+        batch = batches[0]
+        try:
+            await REST_SCHEDULER.call("log", ("send", channel.id), lambda: channel.send(embeds=batch))
+            self.stats["messages"] += 1
+            self.stats["embeds"] += len(batch)
+        except RequestShed:
+            # Abandonné par le planificateur REST (incident en cours) : non renvoyé
+            self.stats["dropped"] += len(batch)
+        except discord.NotFound:
+            self.invalidate_channel(guild_id)
+            queue.clear()
+        except discord.HTTPException as e:
+            self.stats["errors"] += 1
+            logging.error(f"Erreur envoi logs serveur {guild_id}: {e}")
+
+    async def drain(self):
+        """Envoie immédiatement tout ce qui est en attente (arrêt du bot)"""
+        for guild_id, queue in list(self.queues.items()):
+            while queue or self.dropped.get(guild_id):
+                await self._send_batch(guild_id, queue)
+
+LOG_DISPATCHER = LogDispatcher()
+
+def log_event(guild, embed):
+    """Ajoute un embed à la file de logs du serveur, s'il a un canal de logs"""
+    return LOG_DISPATCHER.enqueue(guild.id, embed)
+
+# MODÈLES D'EMBEDS
+class EmbedTemplate:
+    """Embed dont la partie statique (images, champs, pied) est construite une seule fois.
+
+    render() copie l'embed de base et ne remplit que la description ; les
+    champs sont partagés avec le modèle et ne doivent pas être modifiés.
+    """
+
+    def __init__(self, title, description, color, image=None, thumbnail=None, fields=(), footer=None):
+        self.description = description
+        self.base = discord.Embed(title=title, color=color)
+        if image:
+            self.base.set_image(url=image)
+        if thumbnail:
+            self.base.set_thumbnail(url=thumbnail)
+        for name, value in fields:
+            self.base.add_field(name=name, value=value, inline=False)
+        if footer:
+            self.base.set_footer(text=footer, icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png")
+
+    def render(self, **values):
+        """Retourne un embed complété avec les valeurs dynamiques"""
+        values.setdefault("timestamp", int(datetime.now().timestamp()))
+        embed = self.base.copy()
+        embed.description = self.description.format(**values)
+        return embed
+
+LOCKDOWN_TEMPLATE = EmbedTemplate(
+    title="🚨 ⚠️ **ALERTE SÉCURITÉ MAXIMALE** ⚠️ 🚨",
+    description="```diff\n- SERVEUR EN VERROUILLAGE TOTAL\n- ACCÈS COMMUNICATION SUSPENDU\n- SEULS LES ADMINISTRATEURS AUTORISÉS\n```\n\n**📋 RAISON:** `{reason}`\n**🔐 STATUT:** `VERROUILLÉ`\n**⏰ HEURE:** <t:{timestamp}:F>\n**👤 MODÉRATEUR:** {moderator}",
+    color=0xff0000,
+    image="https://media.giphy.com/media/l0HlBO7eyXzSZkJri/giphy.gif",
+    thumbnail="https://media.giphy.com/media/xTiTnHXbRoaZ1B1Mo8/giphy.gif",
+    fields=[
+        ("🛡️ **PROTOCOLE DE SÉCURITÉ ACTIVÉ**", "```yaml\n✅ Communications bloquées\n✅ Permissions révoquées\n✅ Surveillance active\n✅ Mode défensif engagé```")
+    ],
+    footer="🔒 SYSTÈME DE SÉCURITÉ ASTRAL | VERROUILLAGE TOTAL ENGAGÉ"
+)
+
+UNLOCK_TEMPLATE = EmbedTemplate(
+    title="🎉 ✨ **LIBÉRATION TOTALE** ✨ 🎉",
+    description="```diff\n+ SERVEUR DÉVERROUILLÉ AVEC SUCCÈS\n+ COMMUNICATIONS RÉTABLIES\n+ ACCÈS TOTAL RESTAURÉ\n```\n\n**🔓 STATUT:** `OPÉRATIONNEL`\n**⏰ HEURE:** <t:{timestamp}:F>\n**👤 MODÉRATEUR:** {moderator}\n**💬 MESSAGE:** `Bienvenue de retour ! Le serveur est maintenant pleinement opérationnel.`",
+    color=0x00ff66,
+    image="https://media.giphy.com/media/26u4cqiYI30juCOGY/giphy.gif",
+    thumbnail="https://media.giphy.com/media/3o7abKhOpu0NwenH3O/giphy.gif",
+    fields=[
+        ("🎊 **SYSTÈME LIBÉRÉ**", "```yaml\n✅ Communications rétablies\n✅ Permissions restaurées\n✅ Mode normal activé\n✅ Activité autorisée```"),
+        ("🌟 **STATUT DU SERVEUR**", "```css\n[OPÉRATIONNEL] Toutes les fonctionnalités disponibles\n[SÉCURISÉ] Protection active maintenue\n[STABLE] Système en fonctionnement optimal```")
+    ],
+    footer="🔓 SYSTÈME DE SÉCURITÉ ASTRAL | ACCÈS TOTAL RESTAURÉ"
+)
+
+MAINTENANCE_TEMPLATE = EmbedTemplate(
+    title="🚧 ⚠️ **MAINTENANCE EN COURS** ⚠️ 🚧",
+    description="```diff\n- SERVEUR EN MAINTENANCE TECHNIQUE\n- ACCÈS UTILISATEUR SUSPENDU\n- INTERVENTIONS ADMINISTRATIVES EN COURS\n```\n\n**🔧 RAISON:** `{reason}`\n**⚙️ STATUT:** `MAINTENANCE ACTIVE`\n**⏰ DÉBUT:** <t:{timestamp}:F>\n**👨‍💻 TECHNICIEN:** {moderator}",
+    color=0xffa500,
+    image="https://media.giphy.com/media/3oKIPnAiaMCws8nOsE/giphy.gif",
+    thumbnail="https://media.giphy.com/media/xTiTnHXbRoaZ1B1Mo8/giphy.gif",
+    fields=[
+        ("⚙️ **OPÉRATIONS EN COURS**", "```yaml\n🔧 Maintenance système active\n🛠️ Interventions techniques\n🔄 Optimisations serveur\n⏸️ Communications suspendues```"),
+        ("🚫 **RESTRICTIONS ACTIVES**", "```css\n[BLOQUÉ] Messages utilisateurs\n[AUTORISÉ] Communications admin\n[ACTIF] Surveillance système\n[STANDBY] Fonctions normales```"),
+        ("📋 **INFORMATIONS**", "```fix\nDurée estimée: En cours d'évaluation\nImpact: Communications temporairement suspendues\nContact: Équipe administrative disponible```")
+    ],
+    footer="🔧 SYSTÈME DE MAINTENANCE ASTRAL | MODE TECHNIQUE ACTIVÉ"
+)
+
+MAINTENANCE_END_TEMPLATE = EmbedTemplate(
+    title="🎉 ✨ **MAINTENANCE TERMINÉE** ✨ 🎉",
+    description="```diff\n+ MAINTENANCE TECHNIQUE COMPLÉTÉE\n+ SERVEUR PLEINEMENT OPÉRATIONNEL\n+ COMMUNICATIONS RÉTABLIES\n```\n\n**✅ STATUT:** `OPÉRATIONNEL`\n**⏰ FIN:** <t:{timestamp}:F>\n**👨‍💻 TECHNICIEN:** {moderator}\n**🔄 RÉSULTAT:** `Maintenance réussie - Système optimisé`",
+    color=0x00ff66,
+    image="https://media.giphy.com/media/26u4cqiYI30juCOGY/giphy.gif",
+    thumbnail="https://media.giphy.com/media/3o7abKhOpu0NwenH3O/giphy.gif",
+    fields=[
+        ("🎊 **MAINTENANCE RÉUSSIE**", "```yaml\n✅ Système entièrement opérationnel\n✅ Communications restaurées\n✅ Optimisations appliquées\n✅ Serveur stabilisé```"),
+        ("🌟 **AMÉLIORATIONS APPORTÉES**", "```css\n[OPTIMISÉ] Performances système\n[SÉCURISÉ] Protocoles de sécurité\n[STABLE] Fonctionnement optimal\n[DISPONIBLE] Toutes fonctionnalités```"),
+        ("📢 **ANNONCE**", "```fix\nLe serveur est maintenant pleinement fonctionnel !\nMerci de votre patience pendant la maintenance.\nToutes les fonctionnalités sont disponibles.```")
+    ],
+    footer="✅ SYSTÈME DE MAINTENANCE ASTRAL | SERVEUR OPÉRATIONNEL"
+)
+
+# VERROUILLAGE
+LOCKDOWN_CONCURRENCY = 5  # modifications de permissions simultanées
+
+async def run_concurrently(items, worker, limit=LOCKDOWN_CONCURRENCY, on_progress=None):
+    """Exécute worker(item) pour chaque élément avec au plus `limit` appels simultanés.
+
+    Retourne la liste des résultats dans l'ordre des éléments ; une exception
+    levée par worker est retournée à la place du résultat.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    done = 0
+
+    async def run(item):
+        nonlocal done
+        async with semaphore:
+            try:
+                result = await worker(item)
+            except Exception as e:
+                result = e
+        done += 1
+        if on_progress:
+            await on_progress(done, len(items))
+        return result
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+class ProgressReporter:
+    """Affiche l'avancement dans la réponse d'une interaction (au plus une édition par intervalle)"""
+
+    def __init__(self, interaction, label, interval=2.0):
+        self.interaction = interaction
+        self.label = label
+        self.interval = interval
+        self.last_update = 0.0
+
+    async def __call__(self, done, total):
+        await self.update(f"`{done}/{total}`", final=done >= total)
+
+    async def update(self, status, final=False):
+        now = time.monotonic()
+        if not final and now - self.last_update < self.interval:
+            return
+        self.last_update = now
+        try:
+            await self.interaction.edit_original_response(content=f"{self.label} {status}")
+        except discord.HTTPException:
+            pass
+
+# Instantanés des verrouillages qui peuvent se chevaucher (lockdown pendant une maintenance...)
+LOCK_SNAPSHOT_KEYS = {"lockdown_snapshot": "verrouillage", "maintenance_snapshot": "maintenance"}
+
+def other_active_lock(data, snapshot_key):
+    """Clé de l'autre verrouillage actif sur le serveur (ou None)"""
+    for key in LOCK_SNAPSHOT_KEYS:
+        if key != snapshot_key and data.get(key):
+            return key
+    return None
+
+def count_results(results):
+    """Compte les réussites et les échecs retournés par run_concurrently"""
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    return len(results) - failed, failed
+
+async def lock_guild(guild, mode="channels", snapshot_key="lockdown_snapshot", reason=None, on_progress=None):
+    """Retire l'envoi de messages à @everyone et sauvegarde l'état précédent.
+
+    mode "channels" : une permission par canal texte (l'overwrite existant est conservé
+    et seul send_messages est forcé) ; mode "role" : un seul appel qui modifie les
+    permissions du rôle @everyone (les overwrites autorisant explicitement l'envoi
+    ne sont alors pas couverts). Si un autre verrouillage est déjà actif, son mode
+    et ses permissions d'origine sont repris : le dernier déverrouillage restaure
+    l'état d'avant le premier. Retourne (réussis, échecs).
+    """
+    data = get_server_data(guild.id)
+    everyone = guild.default_role
+    SERVER_DATA.pin(guild.id, snapshot_key)
+    other_key = other_active_lock(data, snapshot_key)
+    other = data[other_key] if other_key else None
+    # Un verrouillage déjà actif garde son instantané d'origine
+    created = not data.get(snapshot_key)
+    snapshot = data.get(snapshot_key) or {"mode": other["mode"] if other else mode}
+    mode = snapshot["mode"]
+
+    if mode == "role":
+        snapshot.setdefault("permissions", other["permissions"] if other else everyone.permissions.value)
+        data[snapshot_key] = snapshot
+        save_server_data(guild.id, data)
+        await flush_server_data(guild.id)
+
+        permissions = discord.Permissions(everyone.permissions.value)
+        permissions.update(send_messages=False, send_messages_in_threads=False, create_public_threads=False, add_reactions=False)
+        try:
+            await REST_SCHEDULER.call("permissions", ("role", everyone.id), lambda: everyone.edit(permissions=permissions, reason=reason))
+        except Exception:
+            # Rien n'a été modifié : l'instantané créé ici ne doit pas faire croire à un verrouillage
+            if created:
+                data[snapshot_key] = None
+                save_server_data(guild.id, data)
+                await flush_server_data(guild.id)
+                SERVER_DATA.unpin(guild.id, snapshot_key)
+            raise
+        if on_progress:
+            await on_progress(1, 1)
+        return 1, 0
+
+    channels = guild.text_channels
+    saved = snapshot.setdefault("channels", {})
+    other_saved = other.get("channels", {}) if other else {}
+    for channel in channels:
+        if str(channel.id) in saved:
+            continue
+        if str(channel.id) in other_saved:
+            # Déjà fermé par l'autre verrouillage : l'état d'origine est dans son instantané
+            pair = other_saved[str(channel.id)]
+            saved[str(channel.id)] = list(pair) if pair is not None else None
+        elif everyone in channel.overwrites:
+            allow, deny = channel.overwrites_for(everyone).pair()
+            saved[str(channel.id)] = [allow.value, deny.value]
+        else:
+            saved[str(channel.id)] = None
+    data[snapshot_key] = snapshot
+    save_server_data(guild.id, data)
+    await flush_server_data(guild.id)
+
+    async def lock(channel):
+        overwrite = channel.overwrites_for(everyone)
+        overwrite.send_messages = False
+        await REST_SCHEDULER.call("permissions", ("permissions", channel.id),
+                                  lambda: channel.set_permissions(everyone, overwrite=overwrite, reason=reason))
+
+    results = await run_concurrently(channels, lock, on_progress=on_progress)
+    return count_results(results)
+
+async def unlock_guild(guild, snapshot_key="lockdown_snapshot", reason=None, on_progress=None):
+    """Restaure exactement les permissions sauvegardées par lock_guild. Retourne (réussis, échecs).
+
+    Sans instantané, aucune permission n'est modifiée.
+
+    Si un autre verrouillage reste actif, rien n'est rouvert : ses canaux restent
+    fermés et les états d'origine propres à cet instantané lui sont transmis.
+    """
+    data = get_server_data(guild.id)
+    everyone = guild.default_role
+    snapshot = data.get(snapshot_key)
+
+    other_key = other_active_lock(data, snapshot_key)
+    # (même mode seulement : un instantané "role" et un "channels" ne ferment pas les mêmes permissions)
+    if snapshot and other_key and data[other_key]["mode"] == snapshot["mode"]:
+        if snapshot["mode"] == "channels":
+            other_saved = data[other_key]["channels"]
+            for channel_id, pair in snapshot["channels"].items():
+                other_saved.setdefault(channel_id, pair)
+        data[snapshot_key] = None
+        save_server_data(guild.id, data)
+        await flush_server_data(guild.id)
+        # L'autre verrouillage garde sa propre épingle
+        SERVER_DATA.unpin(guild.id, snapshot_key)
+        return 0, 0
+
+    if not snapshot:
+        # Rien de verrouillé par le bot : les overwrites existants (canaux en lecture seule...) sont laissés tels quels
+        return 0, 0
+
+    if snapshot["mode"] == "role":
+        permissions = discord.Permissions(snapshot["permissions"])
+        await REST_SCHEDULER.call("permissions", ("role", everyone.id), lambda: everyone.edit(permissions=permissions, reason=reason))
+        data[snapshot_key] = None
+        save_server_data(guild.id, data)
+        await flush_server_data(guild.id)
+        SERVER_DATA.unpin(guild.id, snapshot_key)
+        if on_progress:
+            await on_progress(1, 1)
+        return 1, 0
+
+    saved = snapshot["channels"]
+    entries = [(guild.get_channel(int(channel_id)), channel_id, pair) for channel_id, pair in saved.items()]
+    # Les canaux supprimés depuis le verrouillage sont simplement oubliés
+    entries = [entry for entry in entries if entry[0] is not None]
+
+    async def restore(entry):
+        channel, channel_id, pair = entry
+        overwrite = None
+        if pair is not None:
+            overwrite = discord.PermissionOverwrite.from_pair(discord.Permissions(pair[0]), discord.Permissions(pair[1]))
+        await REST_SCHEDULER.call("permissions", ("permissions", channel.id),
+                                  lambda: channel.set_permissions(everyone, overwrite=overwrite, reason=reason))
+        return channel_id
+
+    results = await run_concurrently(entries, restore, on_progress=on_progress)
+    # Les canaux en échec restent dans l'instantané pour un prochain déverrouillage
+    remaining = {channel_id: pair for (_, channel_id, pair), result in zip(entries, results) if isinstance(result, Exception)}
+    data[snapshot_key] = {"mode": "channels", "channels": remaining} if remaining else None
+    save_server_data(guild.id, data)
+    await flush_server_data(guild.id)
+    if not remaining:
+        SERVER_DATA.unpin(guild.id, snapshot_key)
+    return count_results(results)
+
+# DIFFUSION
+BROADCAST_CONCURRENCY = 10  # canaux servis simultanément (le planificateur REST borne ensuite par route)
+BROADCAST_REPORT_LINES = 15  # échecs détaillés dans le rapport
+BROADCAST_TARGETS = [
+    app_commands.Choice(name="Tous les canaux texte", value="all"),
+    app_commands.Choice(name="Une catégorie", value="category"),
+    app_commands.Choice(name="Canaux d'annonce configurés", value="list")
+]
+
+def broadcast_channels(guild, target="all", category=None):
+    """Canaux visés par une diffusion : tous, ceux d'une catégorie ou la liste configurée"""
+    if target == "category":
+        return list(category.text_channels) if category is not None else []
+    if target == "list":
+        channels = (guild.get_channel(channel_id) for channel_id in get_server_data(guild.id)["broadcast_channels"])
+        return [channel for channel in channels if channel is not None]
+    return list(guild.text_channels)
+
+def describe_send_error(error):
+    """Traduit l'échec d'un envoi pour le rapport de diffusion"""
+    if isinstance(error, RequestShed):
+        return "abandonné (surcharge)"
+    if isinstance(error, discord.Forbidden):
+        return "permission manquante"
+    if isinstance(error, discord.NotFound):
+        return "canal introuvable"
+    if isinstance(error, discord.HTTPException):
+        return f"erreur Discord {error.status}"
+    return str(error) or type(error).__name__
+
+class BroadcastJob:
+    """Envoi d'un même message dans une liste de canaux.
+
+    Un seul message par canal (contenu + embed), au plus BROADCAST_CONCURRENCY
+    canaux à la fois, dans la voie des annonces du planificateur REST. Les
+    échecs sont relevés canal par canal. Annulable avec cancel() : les canaux
+    pas encore servis sont ignorés.
+    """
+
+    def __init__(self, channels, content=None, embed=None):
+        self.channels = channels
+        self.content = content
+        self.embed = embed
+        self.cancelled = asyncio.Event()
+        self.sent = 0
+        self.skipped = 0
+        self.failures = {}
+
+    def cancel(self):
+        self.cancelled.set()
+
+    async def run(self, on_progress=None):
+        await run_concurrently(self.channels, self.send, limit=BROADCAST_CONCURRENCY, on_progress=on_progress)
+        METRICS.inc("broadcast_messages_total", self.sent)
+        METRICS.inc("broadcast_failures_total", len(self.failures))
+        return self
+
+    async def send(self, channel):
+        if self.cancelled.is_set():
+            self.skipped += 1
+            return
+        try:
+            await REST_SCHEDULER.call("announce", ("send", channel.id),
+                                      lambda: channel.send(content=self.content, embed=self.embed))
+            self.sent += 1
+        except (RequestShed, discord.HTTPException) as e:
+            self.failures[channel] = describe_send_error(e)
+
+    def status(self):
+        status = f"`{self.sent}/{len(self.channels)}` canaux, `{len(self.failures)}` échecs"
+        if self.skipped:
+            status += f", `{self.skipped}` annulés"
+        return status
+
+    def report(self):
+        """Résumé de la diffusion avec le détail des premiers échecs"""
+        if not self.channels:
+            return "📢 **Diffusion** : aucun canal ciblé"
+        lines = [f"📢 **Diffusion {'annulée' if self.cancelled.is_set() else 'terminée'}** — {self.status()}"]
+        failures = list(self.failures.items())
+        lines += [f"• {channel.mention}: {reason}" for channel, reason in failures[:BROADCAST_REPORT_LINES]]
+        if len(failures) > BROADCAST_REPORT_LINES:
+            lines.append(f"… et {len(failures) - BROADCAST_REPORT_LINES} autres")
+        return "\n".join(lines)
+
+# Diffusion en cours par serveur : la plus récente remplace la précédente (le déverrouillage rend l'annonce du verrouillage caduque)
+BROADCAST_JOBS = {}
+
+async def run_broadcast(interaction, channels, label, content=None, embed=None):
+    """Diffuse un message dans `channels` en affichant l'avancement dans la réponse de l'interaction"""
+    guild_id = interaction.guild.id
+    previous = BROADCAST_JOBS.get(guild_id)
+    if previous is not None:
+        previous.cancel()
+    job = BROADCAST_JOBS[guild_id] = BroadcastJob(channels, content=content, embed=embed)
+    try:
+        await job.run(on_progress=ProgressReporter(interaction, label))
+    finally:
+        if BROADCAST_JOBS.get(guild_id) is job:
+            del BROADCAST_JOBS[guild_id]
+    return job
+
+# BAN DE MASSE
+SNOWFLAKE_RE = re.compile(r"\b\d{15,20}\b")
+BULK_BAN_SIZE = 200  # maximum accepté par l'endpoint de ban groupé
+MASSBAN_CONCURRENCY = 5
+MASSBAN_MAX_FILE_SIZE = 1024 * 1024
+
+def parse_user_ids(text):
+    """Extrait les identifiants Discord d'un texte, sans doublons (ordre conservé)"""
+    return list(dict.fromkeys(int(match) for match in SNOWFLAKE_RE.findall(text)))
+
+def describe_ban_error(error):
+    """Traduit une erreur de ban pour le rapport"""
+    if isinstance(error, discord.NotFound):
+        return "utilisateur introuvable"
+    if isinstance(error, discord.Forbidden):
+        return "permission refusée"
+    return str(error)
+
+async def ban_user_ids(guild, user_ids, reason=None, on_progress=None):
+    """Bannit des identifiants directement, sans récupérer les utilisateurs.
+
+    Utilise l'endpoint de ban groupé quand la version de discord.py le propose
+    (Guild.bulk_ban), sinon des bans individuels en parallèle limité.
+    Retourne {user_id: (réussi, détail)}.
+    """
+    results = {}
+    total = len(user_ids)
+
+    if hasattr(guild, "bulk_ban"):
+        for start in range(0, total, BULK_BAN_SIZE):
+            chunk = user_ids[start:start + BULK_BAN_SIZE]
+            try:
+                objects = [discord.Object(id=user_id) for user_id in chunk]
+                result = await REST_SCHEDULER.call("ban", ("ban", guild.id), lambda: guild.bulk_ban(objects, reason=reason))
+                for user in result.banned:
+                    results[user.id] = (True, "")
+                for user in result.failed:
+                    results[user.id] = (False, "refusé par Discord")
+            except discord.HTTPException as e:
+                for user_id in chunk:
+                    results[user_id] = (False, describe_ban_error(e))
+            if on_progress:
+                await on_progress(min(start + BULK_BAN_SIZE, total), total)
+        return results
+
+    async def ban_one(user_id):
+        await REST_SCHEDULER.call("ban", ("ban", guild.id), lambda: guild.ban(discord.Object(id=user_id), reason=reason))
+
+    outcomes = await run_concurrently(user_ids, ban_one, limit=MASSBAN_CONCURRENCY, on_progress=on_progress)
+    for user_id, outcome in zip(user_ids, outcomes):
+        results[user_id] = (False, describe_ban_error(outcome)) if isinstance(outcome, Exception) else (True, "")
+    return results
+
+def build_ban_report(results):
+    """Construit le rapport CSV (un identifiant par ligne) d'un ban de masse"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["user_id", "statut", "detail"])
+    for user_id, (success, detail) in results.items():
+        writer.writerow([user_id, "banni" if success else "échec", detail])
+    return discord.File(io.BytesIO(buffer.getvalue().encode("utf-8")), filename="massban_report.csv")
+
+# PURGE
+BULK_DELETE_MAX_AGE = timedelta(days=14, minutes=-5)  # au-delà, l'API refuse la suppression groupée
+PURGE_CONCURRENCY = 3  # canaux purgés simultanément
+SINGLE_DELETE_INTERVAL = 1.0  # secondes entre deux suppressions unitaires (messages de plus de 14 jours)
+CLEAR_MAX_MESSAGES = 1000  # plafond de /clear (les vieux messages coûtent une seconde chacun)
+
+class PurgeFilter:
+    """Critères de sélection des messages à purger (tous optionnels, cumulés)"""
+
+    def __init__(self, author_id=None, bots_only=False, contains=None, pattern=None, attachments_only=False):
+        self.author_id = author_id
+        self.bots_only = bots_only
+        self.contains = contains.casefold() if contains else None
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.attachments_only = attachments_only
+
+    def matches(self, message):
+        if self.author_id is not None and message.author.id != self.author_id:
+            return False
+        if self.bots_only and not message.author.bot:
+            return False
+        if self.attachments_only and not message.attachments:
+            return False
+        if self.contains is not None and self.contains not in message.content.casefold():
+            return False
+        if self.pattern is not None and not self.pattern.search(message.content):
+            return False
+        return True
+
+class PurgeJob:
+    """Purge en flux de l'historique de plusieurs canaux.
+
+    L'historique est lu page par page, du plus récent au plus ancien : les
+    messages de moins de 14 jours partent par lots de 100 (un appel par lot),
+    les plus anciens une par une à SINGLE_DELETE_INTERVAL d'intervalle.
+    Annulable à tout moment avec cancel().
+    """
+
+    def __init__(self, channels, purge_filter, limit, after=None, before=None, on_progress=None):
+        self.channels = channels
+        self.filter = purge_filter
+        self.limit = limit
+        self.after = after
+        self.before = before
+        self.on_progress = on_progress
+        self.cancelled = asyncio.Event()
+        self.single_lock = asyncio.Lock()
+        self.last_single = 0.0
+        self.stats = {"scanned": 0, "bulk": 0, "single": 0, "failed": 0}
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def status(self):
+        s = self.stats
+        return f"`{s['scanned']}` lus, `{s['bulk'] + s['single']}` supprimés ({s['single']} anciens), `{s['failed']}` échecs"
+
+    async def run(self):
+        results = await run_concurrently(self.channels, self.purge_channel, limit=PURGE_CONCURRENCY)
+        self.stats["failed_channels"] = sum(1 for result in results if isinstance(result, Exception))
+        return self.stats
+
+    async def purge_channel(self, channel):
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        batch = []
+        # Toujours du plus récent au plus ancien (avec `after`, discord.py lit sinon dans l'ordre chronologique)
+        async for message in channel.history(limit=self.limit, before=self.before, after=self.after, oldest_first=False):
+            if self.cancelled.is_set():
+                break
+            self.stats["scanned"] += 1
+            if not self.filter.matches(message):
+                continue
+            if message.created_at > cutoff:
+                batch.append(message)
+                if len(batch) == BULK_DELETE_SIZE:
+                    await self.delete_bulk(channel, batch)
+                    batch = []
+            else:
+                # Plus rien de récent à venir (ordre antichronologique) : on vide le lot en cours
+                if batch:
+                    await self.delete_bulk(channel, batch)
+                    batch = []
+                await self.delete_single(message)
+            if self.on_progress:
+                await self.on_progress(self.status())
+        if batch and not self.cancelled.is_set():
+            await self.delete_bulk(channel, batch)
+
+    async def delete_bulk(self, channel, messages):
+        try:
+            await REST_SCHEDULER.call("delete", ("delete", channel.id), lambda: channel.delete_messages(messages, reason="Purge"))
+            self.stats["bulk"] += len(messages)
+        except discord.HTTPException as e:
+            self.stats["failed"] += len(messages)
+            logging.debug(f"Purge groupée {channel.id} échouée: {e}")
+
+    async def delete_single(self, message):
+        async with self.single_lock:
+            wait = self.last_single + SINGLE_DELETE_INTERVAL - time.monotonic()
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(self.cancelled.wait(), timeout=wait)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            self.last_single = time.monotonic()
+        try:
+            await REST_SCHEDULER.call("delete", ("delete", message.channel.id), message.delete)
+            self.stats["single"] += 1
+        except discord.HTTPException:
+            self.stats["failed"] += 1
+
+# Purge en cours par serveur (une seule à la fois)
+PURGE_JOBS = {}
+
+# DÉTECTION DE RAID
+RAID_BATCH_DELAY = 2.0  # secondes d'accumulation de la cohorte avant sanction
+RAID_COOLDOWN = 60  # tant que les arrivées continuent, elles rejoignent la cohorte
+
+def largest_creation_cluster(members, span_seconds):
+    """Plus grand groupe de comptes créés à moins de `span_seconds` les uns des autres"""
+    members = sorted(members, key=lambda m: m.created_at)
+    best_start, best_end, start = 0, 0, 0
+    for end, member in enumerate(members):
+        while (member.created_at - members[start].created_at).total_seconds() > span_seconds:
+            start += 1
+        if end + 1 - start > best_end - best_start:
+            best_start, best_end = start, end + 1
+    return members[best_start:best_end]
+
+class JoinBurstDetector:
+    """Détecte les vagues d'arrivées (N arrivées en T secondes) par serveur.
+
+    Seules les N dernières arrivées sont gardées : le coût par arrivée est O(1)
+    et la mémoire bornée par serveur. Un raid prend fin RAID_COOLDOWN secondes
+    après la dernière arrivée au-dessus du seuil.
+    """
+
+    def __init__(self):
+        self.recent = {}
+        self.active_until = {}
+
+    def record(self, guild_id, member, threshold, window, span_hours=0, now=None):
+        """Enregistre une arrivée ; retourne (cohorte, nouveau_raid) si elle fait partie d'un raid"""
+        now = time.monotonic() if now is None else now
+        recent = self.recent.get(guild_id)
+        if recent is None or recent.maxlen != threshold:
+            recent = deque(maxlen=threshold)
+            self.recent[guild_id] = recent
+        recent.append((now, member))
+        burst = len(recent) >= threshold and now - recent[0][0] <= window
+
+        if self.active_until.get(guild_id, 0) > now:
+            # Le raid n'est prolongé que tant que le débit d'arrivées reste au-dessus du seuil
+            if burst:
+                self.active_until[guild_id] = now + RAID_COOLDOWN
+            return [member], False
+        if not burst:
+            return None
+
+        cohort = [m for _, m in recent]
+        if span_hours:
+            cohort = largest_creation_cluster(cohort, span_hours * 3600)
+            if len(cohort) < threshold:
+                return None
+        recent.clear()
+        self.active_until[guild_id] = now + RAID_COOLDOWN
+        return cohort, True
+
+    def is_active(self, guild_id, now=None):
+        now = time.monotonic() if now is None else now
+        return self.active_until.get(guild_id, 0) > now
+
+JOIN_DETECTOR = JoinBurstDetector()
+
+# Membres de la cohorte en attente de sanction, par serveur
+RAID_PENDING = {}
+
+async def handle_raid_joins(guild, members, new_raid):
+    """Ajoute des membres à la cohorte du raid ; la sanction est appliquée par lot"""
+    data = get_server_data(guild.id)
+    pending = RAID_PENDING.setdefault(guild.id, {})
+    first_batch = not pending
+    for member in members:
+        pending[member.id] = member
+
+    if new_raid:
+        SERVER_DATA.pin(guild.id, "raid")
+        spawn(release_when_calm(guild.id))
+        logging.warning(f"🚨 Raid détecté sur {guild.id}: {len(members)} arrivées en {data['raid_join_window']}s")
+        embed = discord.Embed(
+            title="🚨 Raid détecté",
+            description=f"{len(members)} arrivées en moins de {data['raid_join_window']}s\nRéponse: `{data['raid_action']}`",
+            color=0xff0000
+        )
+        log_event(guild, embed)
+        if data["raid_auto_lockdown"]:
+            spawn(auto_lockdown(guild))
+
+    if first_batch:
+        spawn(flush_raid_cohort(guild))
+
+async def auto_lockdown(guild):
+    """Verrouillage automatique d'un raid ; un échec est signalé dans les logs du serveur"""
+    try:
+        await lock_guild(guild, mode="role", reason="Protection anti-raid: verrouillage automatique")
+    except Exception as e:
+        logging.exception(f"❌ Échec du verrouillage automatique sur {guild.id}")
+        embed = discord.Embed(
+            title="❌ Échec du verrouillage automatique",
+            description=f"Le serveur n'a pas été verrouillé : {describe_send_error(e)}\nUtilisez `/admin lockdown` manuellement.",
+            color=0xff0000
+        )
+        log_event(guild, embed)
+
+async def release_when_calm(guild_id):
+    """Libère le serveur du cache épinglé une fois le raid terminé"""
+    while JOIN_DETECTOR.is_active(guild_id):
+        await asyncio.sleep(RAID_COOLDOWN / 2)
+    SERVER_DATA.unpin(guild_id, "raid")
+
+async def flush_raid_cohort(guild):
+    """Sanctionne en une fois les membres accumulés dans la cohorte"""
+    await asyncio.sleep(RAID_BATCH_DELAY)
+    members = RAID_PENDING.pop(guild.id, {})
+    if not members:
+        return
+
+    data = get_server_data(guild.id)
+    action = data["raid_action"]
+    reason = "Protection anti-raid: vague d'arrivées"
+    done = 0
+
+    if action == "ban":
+        results = await ban_user_ids(guild, list(members), reason=reason)
+        done = sum(1 for success, _ in results.values() if success)
+    elif action == "quarantine":
+        role = guild.get_role(data["raid_quarantine_role_id"] or 0)
+        if role is None:
+            logging.warning(f"⚠️ Rôle de quarantaine introuvable sur {guild.id}")
+        else:
+            results = await run_concurrently(
+                list(members.values()),
+                lambda m: REST_SCHEDULER.call("role", ("role", guild.id), lambda: m.add_roles(role, reason=reason))
+            )
+            done, _ = count_results(results)
+
+    embed = discord.Embed(
+        title="🛡️ Anti-raid",
+        description=f"Cohorte de {len(members)} membres — action `{action}`: {done} traités",
+        color=0xff0000
+    )
+    log_event(guild, embed)
+
+# DÉTECTION DE FLOOD DE CONTENU
+FLOOD_MIN_CHARS = 20  # contenus plus courts ignorés ("bonjour à tous" n'est pas un raid)
+FLOOD_MAX_WORDS = 64  # mots pris en compte pour la similarité (coût borné par message)
+FLOOD_SIMILARITY = 0.6  # similarité de Jaccard minimale entre deux contenus "presque identiques"
+FLOOD_MAX_KEYS = 5000  # empreintes gardées par serveur
+FLOOD_MAX_EVENTS = 1000  # messages gardés par groupe
+MINHASH_SIZE = 4  # valeurs de la signature MinHash (une clé d'index chacune)
+WORD_RE = re.compile(r"\w+")
+
+def content_fingerprint(text):
+    """Retourne (empreinte exacte, signature MinHash, mots) du contenu normalisé, ou None s'il est trop court"""
+    words = WORD_RE.findall(normalize_text(text, confusables=True, leet=True))
+    normalized = " ".join(words)
+    if len(normalized) < FLOOD_MIN_CHARS:
+        return None
+    tokens = frozenset(map(hash, words[:FLOOD_MAX_WORDS]))
+    # MinHash "bottom-k" : les k plus petites empreintes de mots
+    signature = sorted(tokens)[:MINHASH_SIZE]
+    return hash(normalized), signature, tokens
+
+class ContentGroup:
+    """Messages de même contenu (ou presque) sur la fenêtre glissante, avec auteurs et canaux distincts"""
+    __slots__ = ("tokens", "events", "users", "members", "channels", "flagged")
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.events = deque()
+        self.users = {}
+        self.members = {}
+        self.channels = {}
+        self.flagged = False
+
+    def add(self, now, member, channel_id, window):
+        self.expire(now, window)
+        self.events.append((now, member.id, channel_id))
+        self.users[member.id] = self.users.get(member.id, 0) + 1
+        self.members[member.id] = member
+        self.channels[channel_id] = self.channels.get(channel_id, 0) + 1
+        if len(self.events) > FLOOD_MAX_EVENTS:
+            self._pop()
+
+    def expire(self, now, window):
+        while self.events and now - self.events[0][0] > window:
+            self._pop()
+        if not self.events:
+            self.flagged = False
+
+    def _pop(self):
+        _, user_id, channel_id = self.events.popleft()
+        self.users[user_id] -= 1
+        if not self.users[user_id]:
+            del self.users[user_id]
+            del self.members[user_id]
+        self.channels[channel_id] -= 1
+        if not self.channels[channel_id]:
+            del self.channels[channel_id]
+
+class DuplicateFloodDetector:
+    """Repère un même contenu posté par plusieurs comptes ou dans plusieurs canaux.
+
+    Chaque message est réduit à une empreinte exacte et à une signature MinHash
+    de MINHASH_SIZE valeurs ; chacune sert de clé dans un index par serveur. Un message
+    rejoint le groupe trouvé par son empreinte exacte, sinon par une valeur
+    MinHash commune (vérifiée par la similarité de Jaccard). Coût constant par
+    message, quel que soit le nombre de membres ou de messages du serveur.
+    """
+
+    def __init__(self, max_guilds):
+        self.max_guilds = max_guilds
+        self.guilds = OrderedDict()
+
+    def check(self, message, window, max_users, max_channels, now=None):
+        """Enregistre le message et retourne son groupe s'il atteint un seuil, sinon None"""
+        fingerprint = content_fingerprint(message.content)
+        if fingerprint is None:
+            return None
+        now = time.monotonic() if now is None else now
+        exact, signature, tokens = fingerprint
+        index = self._index(message.guild.id)
+
+        group = index.get(("exact", exact))
+        if group is None:
+            for value in signature:
+                candidate = index.get(("min", value))
+                if candidate is not None and len(candidate.tokens & tokens) >= FLOOD_SIMILARITY * len(candidate.tokens | tokens):
+                    group = candidate
+                    break
+        if group is None:
+            group = ContentGroup(tokens)
+            for value in signature:
+                self._put(index, ("min", value), group)
+        self._put(index, ("exact", exact), group)
+
+        group.add(now, message.author, message.channel.id, window)
+        if len(group.users) >= max_users or len(group.channels) >= max_channels:
+            return group
+        return None
+
+    def _index(self, guild_id):
+        index = self.guilds.get(guild_id)
+        if index is None:
+            index = self.guilds[guild_id] = OrderedDict()
+            if len(self.guilds) > self.max_guilds:
+                self.guilds.popitem(last=False)
+        else:
+            self.guilds.move_to_end(guild_id)
+        return index
+
+    def _put(self, index, key, group):
+        index[key] = group
+        index.move_to_end(key)
+        if len(index) > FLOOD_MAX_KEYS:
+            index.popitem(last=False)
+
+FLOOD_DETECTOR = DuplicateFloodDetector(SERVER_CACHE_SIZE)
+
+def handle_content_flood(message, group, window):
+    """Nettoie et sanctionne les auteurs d'un contenu répété en masse"""
+    guild = message.guild
+    if not group.flagged:
+        # Premier dépassement : tout le groupe est traité, les suivants un par un
+        group.flagged = True
+        members = list(group.members.values())
+        METRICS.inc("automod_actions_total", reason="content_flood")
+        embed = discord.Embed(
+            title="🧬 Flood de contenu détecté",
+            description=f"{len(group.users)} membres, {len(group.channels)} canaux en moins de {window}s\n"
+                        f"Extrait: `{discord.utils.escape_markdown(message.content[:200])}`",
+            color=0xff0000
+        )
+        log_event(guild, embed)
+    else:
+        members = [message.author]
+
+    for member in members:
+        schedule_cleanup(guild, member.id, window)
+        REST_SCHEDULER.submit("timeout", guild.id, member.id,
+                              lambda member=member: member.timeout(datetime.now() + timedelta(minutes=5), reason="Flood de contenu identique"),
+                              window=300, incident="flood")
+
+# MODE LENT ADAPTATIF
+SLOWMODE_TAU = 10.0  # constante de temps (s) de la moyenne mobile exponentielle du débit
+SLOWMODE_CHECK_INTERVAL = 15  # secondes entre deux vérifications des canaux redevenus calmes
+SLOWMODE_MAX_CHANNELS = 50000  # canaux suivis (les moins récemment actifs sont oubliés)
+
+class ChannelRate:
+    __slots__ = ("channel", "rate", "last", "applied", "original_delay", "changed_at", "policy")
+
+    def __init__(self, channel, now):
+        self.channel = channel
+        self.rate = 0.0
+        self.last = now
+        self.applied = False
+        self.original_delay = 0
+        self.changed_at = now
+        self.policy = None
+
+    def decayed(self, now):
+        """Débit estimé (messages/s) à l'instant `now`, sans nouveau message"""
+        return self.rate * math.exp(-(now - self.last) / SLOWMODE_TAU)
+
+class AdaptiveSlowmode:
+    """Active le mode lent d'un canal quand son débit de messages s'emballe.
+
+    Le débit est une moyenne mobile exponentielle mise à jour en O(1) par
+    message. Hystérésis : le mode lent s'active au-dessus de `high_rate` et ne
+    se retire que sous `low_rate`, après au moins `hold` secondes, ce qui limite
+    les modifications de canal à deux par épisode.
+    """
+
+    def __init__(self, max_channels=SLOWMODE_MAX_CHANNELS):
+        self.max_channels = max_channels
+        self.channels = OrderedDict()
+
+    def record(self, channel, policy, now=None):
+        now = time.monotonic() if now is None else now
+        entry = self.channels.get(channel.id)
+        if entry is None:
+            entry = self.channels[channel.id] = ChannelRate(channel, now)
+            if len(self.channels) > self.max_channels:
+                self._evict()
+        else:
+            self.channels.move_to_end(channel.id)
+        entry.rate = entry.decayed(now) + 1 / SLOWMODE_TAU
+        entry.last = now
+        entry.policy = policy
+
+        if not entry.applied and entry.rate >= policy.slowmode_high_rate:
+            # Un mode lent manuel au moins aussi strict est laissé tel quel
+            if (channel.slowmode_delay or 0) >= policy.slowmode_delay:
+                return
+            entry.applied = True
+            entry.original_delay = channel.slowmode_delay or 0
+            entry.changed_at = now
+            METRICS.inc("slowmode_changes_total", direction="up")
+            REST_SCHEDULER.submit("slowmode", channel.guild.id, channel.id,
+                                  lambda: channel.edit(slowmode_delay=policy.slowmode_delay, reason="Mode lent automatique: débit élevé"),
+                                  route=("slowmode", channel.id))
+        elif entry.applied:
+            self._maybe_release(entry, now)
+
+    def relax(self, now=None):
+        """Retire le mode lent des canaux redevenus calmes (même sans nouveau message)"""
+        now = time.monotonic() if now is None else now
+        for entry in [entry for entry in self.channels.values() if entry.applied]:
+            self._maybe_release(entry, now)
+
+    def _maybe_release(self, entry, now):
+        if now - entry.changed_at < entry.policy.slowmode_hold or entry.decayed(now) > entry.policy.slowmode_low_rate:
+            return
+        self._release(entry, now)
+
+    def _release(self, entry, now):
+        entry.applied = False
+        entry.changed_at = now
+        channel, delay = entry.channel, entry.original_delay
+        METRICS.inc("slowmode_changes_total", direction="down")
+        REST_SCHEDULER.submit("slowmode", channel.guild.id, channel.id,
+                              lambda: channel.edit(slowmode_delay=delay, reason="Mode lent automatique: retour au calme"),
+                              route=("slowmode", channel.id))
+
+    def _evict(self):
+        _, entry = self.channels.popitem(last=False)
+        if entry.applied:
+            self._release(entry, time.monotonic())
+
+    def active(self):
+        return sum(1 for entry in self.channels.values() if entry.applied)
+
+SLOWMODE = AdaptiveSlowmode()
+
+@tasks.loop(seconds=SLOWMODE_CHECK_INTERVAL)
+async def slowmode_loop():
+    """Retire le mode lent automatique des canaux calmés"""
+    SLOWMODE.relax()
+
+# SHARDS
+SHARD_STATUS_DIR = "configs/shards"
+SHARD_STATUS_INTERVAL = 30  # secondes entre deux publications de l'état des shards
+SHARD_STALE_AFTER = 90  # au-delà, un processus qui n'a rien publié est considéré comme bloqué
+
+class ShardHealth:
+    """État de connexion des shards gérés par ce processus"""
+
+    def __init__(self):
+        self.shards = {}
+
+    def record(self, shard_id, state):
+        entry = self.shards.setdefault(shard_id, {"state": state, "since": time.time(), "disconnects": 0})
+        if state == "déconnecté" and entry["state"] != state:
+            entry["disconnects"] += 1
+        entry["state"] = state
+        entry["since"] = time.time()
+
+    def snapshot(self):
+        """Retourne l'état de chaque shard de ce processus, prêt à être publié"""
+        guild_counts = {}
+        for guild in bot.guilds:
+            guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+        shards = []
+        for shard_id, shard in sorted(bot.shards.items()):
+            entry = self.shards.get(shard_id, {"state": "démarrage", "since": time.time(), "disconnects": 0})
+            latency = shard.latency
+            shards.append({
+                "shard_id": shard_id,
+                "state": "fermé" if shard.is_closed() else entry["state"],
+                "since": entry["since"],
+                "latency_ms": None if math.isnan(latency) or math.isinf(latency) else round(latency * 1000),
+                "guilds": guild_counts.get(shard_id, 0),
+                "disconnects": entry["disconnects"]
+            })
+        return {"worker": WORKER_ID, "pid": os.getpid(), "updated": time.time(), "shards": shards}
+
+SHARD_HEALTH = ShardHealth()
+
+def get_shard_status_file(worker_id):
+    return f"{SHARD_STATUS_DIR}/worker_{worker_id}.json"
+
+def read_shard_statuses():
+    """Lit l'état publié par chaque processus du déploiement"""
+    statuses = []
+    if not os.path.isdir(SHARD_STATUS_DIR):
+        return statuses
+    for file_name in sorted(os.listdir(SHARD_STATUS_DIR)):
+        if not re.fullmatch(r"worker_\d+\.json", file_name):
+            continue
+        try:
+            with open(os.path.join(SHARD_STATUS_DIR, file_name), 'r', encoding='utf-8') as f:
+                statuses.append(json.load(f))
+        except (json.JSONDecodeError, OSError):
+            continue
+    return statuses
+
+@tasks.loop(seconds=SHARD_STATUS_INTERVAL)
+async def shard_status_loop():
+    """Publie l'état des shards de ce processus pour la vue /ops shards des autres processus"""
+    content = json.dumps(SHARD_HEALTH.snapshot(), ensure_ascii=False)
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(STORAGE_EXECUTOR, write_file_atomic, get_shard_status_file(WORKER_ID), content)
+    except OSError as e:
+        logging.error(f"Erreur publication état des shards: {e}")
+
+@shard_status_loop.before_loop
+async def before_shard_status_loop():
+    await bot.wait_until_ready()
+
+def shard_ranges(shard_count, workers):
+    """Répartit les shards 0..shard_count-1 en plages contiguës, une par processus"""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+EXIT_CONFIG_ERROR = 78  # erreur de configuration (token invalide...) : relancer ne servirait à rien
+
+def run_launcher(workers, shard_count):
+    """Démarre un processus par plage de shards et relance ceux qui s'arrêtent"""
+    ranges = shard_ranges(shard_count, workers)
+    metrics_port = METRICS_PORT
+
+    def start_worker(worker_id):
+        env = dict(os.environ)
+        env["SHARD_COUNT"] = str(shard_count)
+        env["SHARD_IDS"] = ",".join(map(str, ranges[worker_id]))
+        env["WORKER_ID"] = str(worker_id)
+        if metrics_port:
+            env["METRICS_PORT"] = str(metrics_port + worker_id)
+        logging.info(f"🚀 Processus {worker_id}: shards {ranges[worker_id][0]}-{ranges[worker_id][-1]} / {shard_count}")
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+
+    processes = {worker_id: start_worker(worker_id) for worker_id in range(len(ranges))}
+    # SIGTERM (systemd, docker stop) : même arrêt propre des processus qu'un Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(5)
+            for worker_id, process in list(processes.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                if code == 0:
+                    # Arrêt volontaire : on ne relance pas
+                    logging.info(f"🛑 Processus {worker_id} arrêté")
+                    del processes[worker_id]
+                elif code == EXIT_CONFIG_ERROR:
+                    logging.critical(f"🔑 Processus {worker_id} arrêté sur une erreur de configuration, non relancé")
+                    del processes[worker_id]
+                else:
+                    logging.error(f"💥 Processus {worker_id} arrêté (code {code}), redémarrage")
+                    processes[worker_id] = start_worker(worker_id)
+            if not processes:
+                return
+    except KeyboardInterrupt:
+        logging.info("🛑 Arrêt des processus")
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+# Jauges exportées avec les métriques
+METRICS.gauge("storage_total", lambda: {(("kind", k),): v for k, v in SAVE_STATS.items()})
+METRICS.gauge("storage_dirty_guilds", lambda: len(DIRTY_GUILDS))
+METRICS.gauge("cache", lambda: {(("kind", k),): v for k, v in SERVER_DATA.stats().items()})
+METRICS.gauge("logs_total", lambda: {(("kind", k),): v for k, v in LOG_DISPATCHER.stats.items()})
+METRICS.gauge("logs_pending", lambda: sum(len(q) for q in LOG_DISPATCHER.queues.values()))
+METRICS.gauge("spam_counter_keys", lambda: len(SPAM_COUNTER.entries))
+METRICS.gauge("slowmode_channels_active", lambda: SLOWMODE.active())
+METRICS.gauge("rest_queue_depth", lambda: {(("lane", lane),): len(queue) for lane, queue in REST_SCHEDULER.lanes.items()})
+METRICS.gauge("rest_in_flight", lambda: REST_SCHEDULER.in_flight)
+METRICS.gauge("rest_total", lambda: {(("kind", k),): v for k, v in REST_SCHEDULER.stats.items()})
+METRICS.gauge("gateway_latency_seconds", lambda: 0 if math.isnan(bot.latency) else bot.latency)
+METRICS.gauge("guilds", lambda: len(bot.guilds))
+METRICS.gauge("shard_latency_seconds", lambda: {
+    (("shard", shard_id),): 0 if math.isnan(shard.latency) or math.isinf(shard.latency) else shard.latency
+    for shard_id, shard in bot.shards.items()
+} if SHARD_COUNT else {})
+
+# SYNCHRONISATION DES COMMANDES
+COMMAND_SYNC_FILE = "configs/command_tree.json"
+DEV_GUILD_IDS = [int(g) for g in os.getenv("DEV_GUILD_IDS", "").split(",") if g.strip()]  # sync instantanée sur ces serveurs
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "") == "1"
+
+def command_tree_fingerprint(guild=None):
+    """Empreinte stable de l'arbre de commandes (noms, options, permissions, descriptions)"""
+    payload = sorted((command.to_dict() for command in bot.tree.get_commands(guild=guild)), key=lambda c: c["name"])
+    content = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def load_sync_state():
+    """Empreintes des dernières synchronisations réussies, par application et portée"""
+    try:
+        with open(COMMAND_SYNC_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+async def sync_command_tree():
+    """Synchronise les commandes (globales, ou sur DEV_GUILD_IDS) seulement si l'arbre a changé"""
+    state = load_sync_state()
+    targets = [discord.Object(id=guild_id) for guild_id in DEV_GUILD_IDS] or [None]
+    for guild in targets:
+        if guild is not None:
+            bot.tree.copy_global_to(guild=guild)
+        scope = f"{bot.application_id}:{'global' if guild is None else guild.id}"
+        fingerprint = command_tree_fingerprint(guild)
+        if not FORCE_COMMAND_SYNC and state.get(scope) == fingerprint:
+            logging.info(f"⏭️ Commandes inchangées ({scope}, {fingerprint[:12]}), synchronisation ignorée")
+            continue
+
+        started = time.perf_counter()
+        try:
+            synced = await bot.tree.sync(guild=guild)
+        except discord.HTTPException as e:
+            logging.error(f"❌ Erreur sync ({scope}): {e}")
+            continue
+        logging.info(f"✅ {len(synced)} commandes synchronisées ({scope}) en {time.perf_counter() - started:.2f}s")
+        state[scope] = fingerprint
+        write_file_atomic(COMMAND_SYNC_FILE, json.dumps(state, indent=2))
+
 @bot.event
 async def on_ready():
     print(f'✅ {bot.user} est connecté!')
-    try:
-        synced = await bot.tree.sync()
-        print(f'✅ {len(synced)} commandes synchronisées')
-    except Exception as e:
-        print(f'❌ Erreur sync: {e}')
+    await preload_server_data([guild.id for guild in bot.guilds])
+
+@bot.event
+async def on_shard_connect(shard_id):
+    SHARD_HEALTH.record(shard_id, "connecté")
+
+@bot.event
+async def on_shard_ready(shard_id):
+    SHARD_HEALTH.record(shard_id, "prêt")
+    logging.info(f"✅ Shard {shard_id} prêt")
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    SHARD_HEALTH.record(shard_id, "prêt")
+
+@bot.event
+async def on_shard_disconnect(shard_id):
+    SHARD_HEALTH.record(shard_id, "déconnecté")
+    logging.warning(f"⚠️ Shard {shard_id} déconnecté")
 
 # COMMANDES DE MODÉRATION BASIQUES
 @admin_group.command(name="kick", description="Exclure un membre")
 async def kick(interaction: discord.Interaction, member: discord.Member, reason: str = "Aucune raison"):
+    # Les sanctions passent par le planificateur REST : réponse différée (délai de 3s de l'interaction)
+    await interaction.response.defer()
     try:
-        await member.kick(reason=reason)
+        await REST_SCHEDULER.call("kick", ("kick", interaction.guild.id), lambda: member.kick(reason=reason))
         embed = discord.Embed(title="👢 Membre exclu", description=f"{member.mention} exclu", color=0xff6b6b)
         embed.add_field(name="Raison", value=reason)
         embed.add_field(name="Par", value=interaction.user.mention)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
     except:
-        await interaction.response.send_message("❌ Erreur lors de l'exclusion", ephemeral=True)
+        await interaction.followup.send("❌ Erreur lors de l'exclusion", ephemeral=True)
 
 @admin_group.command(name="ban", description="Bannir un membre")
 async def ban(interaction: discord.Interaction, member: discord.Member, reason: str = "Aucune raison"):
+    await interaction.response.defer()
     try:
-        await member.ban(reason=reason)
+        await REST_SCHEDULER.call("ban", ("ban", interaction.guild.id), lambda: member.ban(reason=reason))
         embed = discord.Embed(title="🔨 Membre banni", description=f"{member.mention} banni", color=0xff0000)
         embed.add_field(name="Raison", value=reason)
         embed.add_field(name="Par", value=interaction.user.mention)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
     except:
-        await interaction.response.send_message("❌ Erreur lors du ban", ephemeral=True)
+        await interaction.followup.send("❌ Erreur lors du ban", ephemeral=True)
 
 @admin_group.command(name="unban", description="Débannir un utilisateur")
 async def unban(interaction: discord.Interaction, user_id: str, reason: str = "Aucune raison"):
+    await interaction.response.defer()
     try:
         user = await bot.fetch_user(int(user_id))
-        await interaction.guild.unban(user, reason=reason)
+        await REST_SCHEDULER.call("ban", ("ban", interaction.guild.id), lambda: interaction.guild.unban(user, reason=reason))
         embed = discord.Embed(title="✅ Utilisateur débanni", description=f"{user.mention} débanni", color=0x00ff00)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
     except:
-        await interaction.response.send_message("❌ Erreur lors du déban", ephemeral=True)
+        await interaction.followup.send("❌ Erreur lors du déban", ephemeral=True)
 
 @admin_group.command(name="mute", description="Timeout un membre")
 async def mute(interaction: discord.Interaction, member: discord.Member, minutes: int = 10, reason: str = "Aucune raison"):
+    await interaction.response.defer()
     try:
         timeout_until = datetime.now() + timedelta(minutes=minutes)
-        await member.timeout(timeout_until, reason=reason)
+        await REST_SCHEDULER.call("timeout", ("timeout", interaction.guild.id), lambda: member.timeout(timeout_until, reason=reason))
         embed = discord.Embed(title="🔇 Membre timeout", description=f"{member.mention} timeout {minutes}min", color=0xffa500)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
     except:
-        await interaction.response.send_message("❌ Erreur lors du timeout", ephemeral=True)
+        await interaction.followup.send("❌ Erreur lors du timeout", ephemeral=True)
 
 @admin_group.command(name="unmute", description="Retirer le timeout")
 async def unmute(interaction: discord.Interaction, member: discord.Member):
+    await interaction.response.defer()
     try:
-        await member.timeout(None)
+        await REST_SCHEDULER.call("timeout", ("timeout", interaction.guild.id), lambda: member.timeout(None))
         embed = discord.Embed(title="🔊 Timeout retiré", description=f"{member.mention} peut parler", color=0x00ff00)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
     except:
-        await interaction.response.send_message("❌ Erreur", ephemeral=True)
+        await interaction.followup.send("❌ Erreur", ephemeral=True)
 
 @admin_group.command(name="clear", description="Supprimer des messages")
-async def clear(interaction: discord.Interaction, amount: int = 10):
+async def clear(interaction: discord.Interaction, amount: app_commands.Range[int, 1, CLEAR_MAX_MESSAGES] = 10):
     try:
-        await interaction.response.defer()
-        deleted = await interaction.channel.purge(limit=min(amount, 100))
-        await interaction.followup.send(f"🧹 {len(deleted)} messages supprimés", ephemeral=True)
-    except:
-        await interaction.followup.send("❌ Erreur", ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+        # Les messages de plus de 14 jours sont aussi supprimés (un par un), au-delà du plafond de 100
+        job = PurgeJob([interaction.channel], PurgeFilter(), limit=amount)
+        stats = await job.run()
+        await interaction.followup.send(f"🧹 {stats['bulk'] + stats['single']} messages supprimés", ephemeral=True)
+    except Exception as e:
+        logging.exception(f"❌ Erreur /clear sur {interaction.channel.id}")
+        await interaction.followup.send(f"❌ Erreur: {describe_send_error(e)}", ephemeral=True)
 
 # SYSTÈME D'AVERTISSEMENTS
+WARNS_PER_PAGE = 10
+
+class WarnLedger:
+    """Registre des avertissements d'un serveur, avec nombre d'avertissements actifs en O(1) amorti.
+
+    L'historique reste dans data["warns"] ; un avertissement plus vieux que
+    warn_decay_days ne compte plus. Les avertissements étant ajoutés dans l'ordre,
+    les actifs forment la fin de chaque liste : un indice par membre marque le
+    premier actif et n'avance qu'au fil des expirations.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.first_active = {}
+        self.decay_days = data["warn_decay_days"]
+
+    def history(self, user_id):
+        return self.data["warns"].get(str(user_id), [])
+
+    def add(self, user_id, reason, moderator, now=None):
+        now = time.time() if now is None else now
+        warn = {
+            "id": uuid.uuid4().hex,
+            "reason": reason,
+            "moderator": moderator,
+            "date": datetime.fromtimestamp(now).strftime("%d/%m/%Y %H:%M"),
+            "timestamp": now
+        }
+        self.data["warns"].setdefault(str(user_id), []).append(warn)
+        return warn
+
+    def remove(self, user_id, number):
+        """Retire l'avertissement n° `number` (1 = le plus ancien de l'historique)"""
+        warns = self.history(user_id)
+        warn = warns.pop(number - 1)
+        if not warns:
+            del self.data["warns"][str(user_id)]
+        self.first_active.pop(str(user_id), None)
+        return warn
+
+    def _first_active(self, user_id, now):
+        if self.decay_days != self.data["warn_decay_days"]:
+            # Période d'expiration modifiée : les indices sont recalculés
+            self.decay_days = self.data["warn_decay_days"]
+            self.first_active.clear()
+        warns = self.history(user_id)
+        index = self.first_active.get(str(user_id), 0)
+        if self.decay_days:
+            cutoff = now - self.decay_days * 86400
+            while index < len(warns) and warns[index]["timestamp"] <= cutoff:
+                index += 1
+            self.first_active[str(user_id)] = index
+        return index
+
+    def active_count(self, user_id, now=None):
+        now = time.time() if now is None else now
+        return len(self.history(user_id)) - self._first_active(user_id, now)
+
+    def is_active(self, user_id, number, now=None):
+        now = time.time() if now is None else now
+        return number > self._first_active(user_id, now)
+
+# Registres construits à la demande, invalidés quand le serveur quitte le cache
+WARN_LEDGERS = {}
+
+def get_warn_ledger(guild_id):
+    data = get_server_data(guild_id)
+    ledger = WARN_LEDGERS.get(guild_id)
+    if ledger is None or ledger.data is not data:
+        ledger = WARN_LEDGERS[guild_id] = WarnLedger(data)
+    return ledger
+
+def build_warns_page(member, ledger, page):
+    """Embed d'une page de l'historique des avertissements (les plus récents d'abord)"""
+    warns = ledger.history(member.id)
+    pages = max(1, math.ceil(len(warns) / WARNS_PER_PAGE))
+    page = min(max(page, 0), pages - 1)
+    now = time.time()
+    embed = discord.Embed(title=f"⚠️ Avertissements de {member.name}", color=0xffff00)
+    end = len(warns) - page * WARNS_PER_PAGE
+    for number in range(end, max(0, end - WARNS_PER_PAGE), -1):
+        warn = warns[number - 1]
+        status = "" if ledger.is_active(member.id, number, now) else " (expiré)"
+        embed.add_field(
+            name=f"Warn #{number}{status}",
+            value=f"**Raison:** {warn['reason']}\n**Modérateur:** {warn['moderator']}\n**Date:** <t:{int(warn['timestamp'])}:f>",
+            inline=False
+        )
+    embed.set_footer(text=f"Page {page + 1}/{pages} • {ledger.active_count(member.id, now)} actifs sur {len(warns)}")
+    return embed, page, pages
+
+class WarnPages(discord.ui.View):
+    """Boutons précédent/suivant pour parcourir les avertissements"""
+
+    def __init__(self, author_id, member, ledger, pages):
+        super().__init__(timeout=120)
+        self.author_id = author_id
+        self.member = member
+        self.ledger = ledger
+        self.page = 0
+        self.pages = pages
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = self.page == 0
+        self.next.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction):
+        return interaction.user.id == self.author_id
+
+    async def show(self, interaction, page):
+        embed, self.page, self.pages = build_warns_page(self.member, self.ledger, page)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction, button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction, button):
+        await self.show(interaction, self.page + 1)
+
 @admin_group.command(name="warn", description="Avertir un membre")
 async def warn(interaction: discord.Interaction, member: discord.Member, reason: str = "Aucune raison"):
     guild_id = interaction.guild.id
     data = get_server_data(guild_id)
-    user_id = str(member.id)
-    
-    if user_id not in data["warns"]:
-        data["warns"][user_id] = []
-
-    warn_data = {
-        "reason": reason,
-        "moderator": interaction.user.name,
-        "date": datetime.now().strftime("%d/%m/%Y %H:%M")
-    }
-    data["warns"][user_id].append(warn_data)
+    ledger = get_warn_ledger(guild_id)
+    ledger.add(member.id, reason, interaction.user.name)
     save_server_data(guild_id, data)
+    warn_count = ledger.active_count(member.id)
 
     embed = discord.Embed(title="⚠️ Avertissement", color=0xffff00)
     embed.add_field(name="Membre", value=member.mention)
     embed.add_field(name="Raison", value=reason)
-    embed.add_field(name="Total warns", value=len(data["warns"][user_id]))
+    embed.add_field(name="Total warns", value=warn_count)
 
     await interaction.response.send_message(embed=embed)
 
-    # Auto-sanction selon le nombre de warns
-    warn_count = len(data["warns"][user_id])
-    if warn_count >= 3:
+    # Auto-sanction selon le nombre de warns actifs
+    threshold = data["warn_ban_threshold"]
+    if threshold and warn_count >= threshold:
         try:
-            await member.ban(reason="3 avertissements atteints")
-            await interaction.followup.send(f"🔨 {member.mention} banni automatiquement (3 warns)")
+            await REST_SCHEDULER.call("ban", ("ban", guild_id), lambda: member.ban(reason=f"{threshold} avertissements atteints"))
+            await interaction.followup.send(f"🔨 {member.mention} banni automatiquement ({threshold} warns)")
         except:
             pass
 
 @admin_group.command(name="warns", description="Voir les avertissements d'un membre")
 async def view_warns(interaction: discord.Interaction, member: discord.Member):
-    guild_id = interaction.guild.id
-    data = get_server_data(guild_id)
-    user_id = str(member.id)
-    warns = data["warns"].get(user_id, [])
+    ledger = get_warn_ledger(interaction.guild.id)
 
-    if not warns:
+    if not ledger.history(member.id):
         return await interaction.response.send_message(f"{member.mention} n'a aucun avertissement", ephemeral=True)
 
-    embed = discord.Embed(title=f"⚠️ Avertissements de {member.name}", color=0xffff00)
-    for i, warn in enumerate(warns, 1):
-        embed.add_field(
-            name=f"Warn #{i}",
-            value=f"**Raison:** {warn['reason']}\n**Modérateur:** {warn['moderator']}\n**Date:** {warn['date']}",
-            inline=False
-        )
-
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    embed, _, pages = build_warns_page(member, ledger, 0)
+    if pages == 1:
+        return await interaction.response.send_message(embed=embed, ephemeral=True)
+    view = WarnPages(interaction.user.id, member, ledger, pages)
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
 @admin_group.command(name="unwarn", description="Retirer un avertissement")
 async def unwarn(interaction: discord.Interaction, member: discord.Member, warn_number: int):
     guild_id = interaction.guild.id
     data = get_server_data(guild_id)
-    user_id = str(member.id)
-    warns = data["warns"].get(user_id, [])
+    ledger = get_warn_ledger(guild_id)
 
-    if not warns or warn_number < 1 or warn_number > len(warns):
+    if warn_number < 1 or warn_number > len(ledger.history(member.id)):
         return await interaction.response.send_message("❌ Numéro d'avertissement invalide", ephemeral=True)
 
-    removed_warn = warns.pop(warn_number - 1)
+    removed_warn = ledger.remove(member.id, warn_number)
     save_server_data(guild_id, data)
-    
+
     embed = discord.Embed(title="✅ Avertissement retiré", color=0x00ff00)
     embed.add_field(name="Membre", value=member.mention)
     embed.add_field(name="Warn retiré", value=removed_warn['reason'])
+    embed.add_field(name="Warns actifs", value=ledger.active_count(member.id))
 
     await interaction.response.send_message(embed=embed)
 
 # COMMANDES DE SÉCURITÉ AVANCÉES
+LOCKDOWN_MODES = [
+    app_commands.Choice(name="Canaux (permissions par canal)", value="channels"),
+    app_commands.Choice(name="Rôle @everyone (un seul appel)", value="role")
+]
+
 @admin_group.command(name="lockdown", description="Verrouiller le serveur")
-async def lockdown(interaction: discord.Interaction, reason: str = "Urgence sécuritaire"):
+@app_commands.choices(mode=LOCKDOWN_MODES, target=BROADCAST_TARGETS)
+async def lockdown(interaction: discord.Interaction, reason: str = "Urgence sécuritaire", mode: app_commands.Choice[str] = None,
+                   target: app_commands.Choice[str] = None, category: discord.CategoryChannel = None):
     await interaction.response.send_message("🔒 **INITIALISATION DU VERROUILLAGE...**", ephemeral=True)
 
     try:
-        # Créer l'embed cinématique
-        lockdown_embed = discord.Embed(
-            title="🚨 ⚠️ **ALERTE SÉCURITÉ MAXIMALE** ⚠️ 🚨",
-            description=f"```diff\n- SERVEUR EN VERROUILLAGE TOTAL\n- ACCÈS COMMUNICATION SUSPENDU\n- SEULS LES ADMINISTRATEURS AUTORISÉS\n```\n\n**📋 RAISON:** `{reason}`\n**🔐 STATUT:** `VERROUILLÉ`\n**⏰ HEURE:** <t:{int(datetime.now().timestamp())}:F>\n**👤 MODÉRATEUR:** {interaction.user.mention}",
-            color=0xff0000
+        # Embed cinématique (modèle précompilé)
+        lockdown_embed = LOCKDOWN_TEMPLATE.render(reason=reason, moderator=interaction.user.mention)
+
+        # Verrouiller tous les canaux (l'état précédent est sauvegardé pour unlock)
+        progress = ProgressReporter(interaction, "🔒 **VERROUILLAGE EN COURS...**")
+        locked_channels, failed_channels = await lock_guild(
+            interaction.guild,
+            mode=mode.value if mode else "channels",
+            reason=f"Lockdown par {interaction.user}: {reason}",
+            on_progress=progress
         )
-        lockdown_embed.set_image(url="https://media.giphy.com/media/l0HlBO7eyXzSZkJri/giphy.gif")
-        lockdown_embed.set_thumbnail(url="https://media.giphy.com/media/xTiTnHXbRoaZ1B1Mo8/giphy.gif")
-        lockdown_embed.add_field(
-            name="🛡️ **PROTOCOLE DE SÉCURITÉ ACTIVÉ**",
-            value="```yaml\n✅ Communications bloquées\n✅ Permissions révoquées\n✅ Surveillance active\n✅ Mode défensif engagé```",
-            inline=False
-        )
-        lockdown_embed.set_footer(text="🔒 SYSTÈME DE SÉCURITÉ ASTRAL | VERROUILLAGE TOTAL ENGAGÉ", icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png")
-
-        # Verrouiller tous les canaux
-        locked_channels = 0
-        for channel in interaction.guild.text_channels:
-            try:
-                await channel.set_permissions(interaction.guild.default_role, send_messages=False)
-                locked_channels += 1
-            except:
-                pass
-
-        # Envoyer dans tous les canaux texte
-        for channel in interaction.guild.text_channels:
-            try:
-                await channel.send("🚨" * 10)
-                await channel.send(embed=lockdown_embed)
-                await channel.send("🚨" * 10)
-            except:
-                pass
 
         # Confirmer dans le canal de commande
-        await interaction.followup.send(f"✅ **VERROUILLAGE TERMINÉ** - {locked_channels} canaux sécurisés", ephemeral=True)
+        await interaction.followup.send(f"✅ **VERROUILLAGE TERMINÉ** - {locked_channels} canaux sécurisés, {failed_channels} échecs", ephemeral=True)
+
+        # Annoncer dans les canaux ciblés (un message par canal)
+        channels = broadcast_channels(interaction.guild, target.value if target else "all", category)
+        job = await run_broadcast(interaction, channels, "📢 **ANNONCE DU VERROUILLAGE...**", content="🚨" * 10, embed=lockdown_embed)
+        await interaction.followup.send(job.report(), ephemeral=True)
 
     except Exception as e:
         await interaction.followup.send("❌ Erreur lors du verrouillage", ephemeral=True)
 
 @admin_group.command(name="unlock", description="Déverrouiller le serveur")
-async def unlock(interaction: discord.Interaction):
+@app_commands.choices(target=BROADCAST_TARGETS)
+async def unlock(interaction: discord.Interaction, target: app_commands.Choice[str] = None, category: discord.CategoryChannel = None):
+    if not get_server_data(interaction.guild.id)["lockdown_snapshot"]:
+        return await interaction.response.send_message("ℹ️ Aucun verrouillage actif : aucune permission modifiée", ephemeral=True)
+
     await interaction.response.send_message("🔓 **INITIALISATION DU DÉVERROUILLAGE...**", ephemeral=True)
 
     try:
-        # Créer l'embed cinématique
-        unlock_embed = discord.Embed(
-            title="🎉 ✨ **LIBÉRATION TOTALE** ✨ 🎉",
-            description=f"```diff\n+ SERVEUR DÉVERROUILLÉ AVEC SUCCÈS\n+ COMMUNICATIONS RÉTABLIES\n+ ACCÈS TOTAL RESTAURÉ\n```\n\n**🔓 STATUT:** `OPÉRATIONNEL`\n**⏰ HEURE:** <t:{int(datetime.now().timestamp())}:F>\n**👤 MODÉRATEUR:** {interaction.user.mention}\n**💬 MESSAGE:** `Bienvenue de retour ! Le serveur est maintenant pleinement opérationnel.`",
-            color=0x00ff66
+        # Embed cinématique (modèle précompilé)
+        unlock_embed = UNLOCK_TEMPLATE.render(moderator=interaction.user.mention)
+
+        # Restaurer les permissions sauvegardées au verrouillage
+        held_by = other_active_lock(get_server_data(interaction.guild.id), "lockdown_snapshot")
+        progress = ProgressReporter(interaction, "🔓 **DÉVERROUILLAGE EN COURS...**")
+        unlocked_channels, failed_channels = await unlock_guild(
+            interaction.guild,
+            reason=f"Unlock par {interaction.user}",
+            on_progress=progress
         )
-        unlock_embed.set_image(url="https://media.giphy.com/media/26u4cqiYI30juCOGY/giphy.gif")
-        unlock_embed.set_thumbnail(url="https://media.giphy.com/media/3o7abKhOpu0NwenH3O/giphy.gif")
-        unlock_embed.add_field(
-            name="🎊 **SYSTÈME LIBÉRÉ**",
-            value="```yaml\n✅ Communications rétablies\n✅ Permissions restaurées\n✅ Mode normal activé\n✅ Activité autorisée```",
-            inline=False
-        )
-        unlock_embed.add_field(
-            name="🌟 **STATUT DU SERVEUR**",
-            value="```css\n[OPÉRATIONNEL] Toutes les fonctionnalités disponibles\n[SÉCURISÉ] Protection active maintenue\n[STABLE] Système en fonctionnement optimal```",
-            inline=False
-        )
-        unlock_embed.set_footer(text="🔓 SYSTÈME DE SÉCURITÉ ASTRAL | ACCÈS TOTAL RESTAURÉ", icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png")
-
-        # Déverrouiller tous les canaux
-        unlocked_channels = 0
-        for channel in interaction.guild.text_channels:
-            try:
-                await channel.set_permissions(interaction.guild.default_role, send_messages=None)
-                unlocked_channels += 1
-            except:
-                pass
-
-        # Envoyer dans tous les canaux texte
-        for channel in interaction.guild.text_channels:
-            try:
-                await channel.send("🎉" * 10)
-                await channel.send(embed=unlock_embed)
-                await channel.send("🎊" * 10)
-            except:
-                pass
 
         # Confirmer dans le canal de commande
-        await interaction.followup.send(f"✅ **DÉVERROUILLAGE TERMINÉ** - {unlocked_channels} canaux libérés", ephemeral=True)
+        await interaction.followup.send(f"✅ **DÉVERROUILLAGE TERMINÉ** - {unlocked_channels} canaux libérés, {failed_channels} échecs", ephemeral=True)
+        if held_by:
+            return await interaction.followup.send(
+                f"ℹ️ La {LOCK_SNAPSHOT_KEYS[held_by]} reste active : les canaux restent fermés jusqu'à sa fin", ephemeral=True)
+
+        # Annoncer dans les canaux ciblés (un message par canal)
+        channels = broadcast_channels(interaction.guild, target.value if target else "all", category)
+        job = await run_broadcast(interaction, channels, "📢 **ANNONCE DU DÉVERROUILLAGE...**", content="🎉" * 10, embed=unlock_embed)
+        await interaction.followup.send(job.report(), ephemeral=True)
 
     except Exception as e:
         await interaction.followup.send("❌ Erreur lors du déverrouillage", ephemeral=True)
@@ -338,18 +3126,20 @@ async def nuke(interaction: discord.Interaction):
     countdown_embed.set_image(url="https://media.giphy.com/media/oe33xf3B50fsc/giphy.gif")
     countdown_embed.add_field(name="⚡ COMPTE À REBOURS", value="```css\n[3] INITIALISATION...\n[2] CHARGEMENT...\n[1] DÉTONATION...\n[0] BOOM! 💥```", inline=False)
 
-    countdown_msg = await interaction.channel.send(embed=countdown_embed)
+    channel = interaction.channel
+    countdown_msg = await REST_SCHEDULER.call("announce", ("send", channel.id), lambda: channel.send(embed=countdown_embed))
 
     # Attendre un peu pour l'effet dramatique
     await asyncio.sleep(3)
 
     try:
-        await interaction.channel.delete()
-        new_channel = await interaction.guild.create_text_channel(
+        guild = interaction.guild
+        await REST_SCHEDULER.call("channel", ("channel", guild.id), channel.delete)
+        new_channel = await REST_SCHEDULER.call("channel", ("channel", guild.id), lambda: guild.create_text_channel(
             name=channel_name,
             position=channel_position,
             category=channel_category
-        )
+        ))
 
         # Message post-nuke cinématique
         nuke_embed = discord.Embed(
@@ -371,31 +3161,39 @@ async def nuke(interaction: discord.Interaction):
         )
         nuke_embed.set_footer(text="💥 SYSTÈME DE PURIFICATION ASTRAL | NUKE RÉUSSI", icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png")
 
-        await new_channel.send("💥" * 15)
-        await new_channel.send(embed=nuke_embed)
-        await new_channel.send("☢️" * 15)
-        await new_channel.send("**🎉 BIENVENUE DANS LE NOUVEAU CANAL PURIFIÉ ! 🎉**")
+        # Un seul message (bannière + embed), comme les diffusions
+        content = "💥" * 15 + "\n**🎉 BIENVENUE DANS LE NOUVEAU CANAL PURIFIÉ ! 🎉**"
+        await REST_SCHEDULER.call("announce", ("send", new_channel.id), lambda: new_channel.send(content=content, embed=nuke_embed))
 
     except Exception as e:
         pass
 
 @admin_group.command(name="massban", description="Bannir plusieurs utilisateurs")
-async def massban(interaction: discord.Interaction, user_ids: str, reason: str = "Ban de masse"):
+async def massban(interaction: discord.Interaction, user_ids: str = "", file: discord.Attachment = None, reason: str = "Ban de masse"):
     await interaction.response.defer()
 
-    ids = user_ids.split()
-    banned_count = 0
-
-    for user_id in ids:
+    # IDs séparés par des espaces et/ou fichier texte/CSV joint
+    text = user_ids
+    if file is not None:
+        if file.size > MASSBAN_MAX_FILE_SIZE:
+            return await interaction.followup.send("❌ Fichier trop volumineux (1 Mo max)")
         try:
-            user = await bot.fetch_user(int(user_id))
-            await interaction.guild.ban(user, reason=reason)
-            banned_count += 1
-        except:
-            continue
+            text += "\n" + (await file.read()).decode("utf-8", errors="ignore")
+        except discord.HTTPException:
+            return await interaction.followup.send("❌ Impossible de lire le fichier joint")
+
+    ids = parse_user_ids(text)
+    if not ids:
+        return await interaction.followup.send("❌ Aucun identifiant valide")
+
+    progress = ProgressReporter(interaction, "🔨 **BAN DE MASSE EN COURS...**")
+    results = await ban_user_ids(interaction.guild, ids, reason=reason, on_progress=progress)
+    banned_count = sum(1 for success, _ in results.values() if success)
 
     embed = discord.Embed(title="🔨 Ban de masse", description=f"{banned_count} utilisateurs bannis", color=0xff0000)
-    await interaction.followup.send(embed=embed)
+    embed.add_field(name="Identifiants uniques", value=len(ids))
+    embed.add_field(name="Échecs", value=len(ids) - banned_count)
+    await interaction.followup.send(embed=embed, file=build_ban_report(results))
 
 @admin_group.command(name="antiraid", description="Activer/désactiver la protection anti-raid")
 async def antiraid(interaction: discord.Interaction, enabled: bool = True):
@@ -417,6 +3215,158 @@ async def automod(interaction: discord.Interaction, enabled: bool = True):
     embed = discord.Embed(title="🤖 Automodération", description=f"Automod {status}", color=color)
     await interaction.response.send_message(embed=embed)
 
+@config_group.command(name="antispam", description="Configurer le seuil anti-spam")
+async def antispam(interaction: discord.Interaction, max_messages: int = 10, window_seconds: int = 60, cleanup_seconds: int = 60):
+    guild_id = interaction.guild.id
+    if max_messages < 1 or window_seconds < 1 or cleanup_seconds < 0:
+        return await interaction.response.send_message("❌ Valeurs invalides", ephemeral=True)
+
+    update_server_data(guild_id, "max_messages_per_minute", max_messages)
+    update_server_data(guild_id, "spam_window_seconds", window_seconds)
+    update_server_data(guild_id, "spam_cleanup_seconds", cleanup_seconds)
+
+    cleanup = f"messages des {cleanup_seconds}s précédentes supprimés" if cleanup_seconds else "pas de nettoyage"
+    embed = discord.Embed(title="🤖 Anti-spam", description=f"Max {max_messages} messages / {window_seconds}s\n🧹 {cleanup}", color=0x00ff00)
+    await interaction.response.send_message(embed=embed)
+
+RAID_ACTIONS = [
+    app_commands.Choice(name="Bannir la cohorte", value="ban"),
+    app_commands.Choice(name="Mettre en quarantaine (rôle)", value="quarantine"),
+    app_commands.Choice(name="Journaliser seulement", value="log")
+]
+
+@config_group.command(name="raid", description="Configurer la détection de vagues d'arrivées")
+@app_commands.choices(action=RAID_ACTIONS)
+async def raid_config(interaction: discord.Interaction, joins: int = 10, seconds: int = 10, account_span_hours: int = 0,
+                      action: app_commands.Choice[str] = None, quarantine_role: discord.Role = None, auto_lockdown: bool = False):
+    guild_id = interaction.guild.id
+    if joins < 2 or seconds < 1 or account_span_hours < 0:
+        return await interaction.response.send_message("❌ Valeurs invalides", ephemeral=True)
+
+    action_value = action.value if action else "ban"
+    if action_value == "quarantine" and quarantine_role is None:
+        return await interaction.response.send_message("❌ Précisez le rôle de quarantaine", ephemeral=True)
+
+    update_server_data(guild_id, "raid_join_threshold", joins)
+    update_server_data(guild_id, "raid_join_window", seconds)
+    update_server_data(guild_id, "raid_account_span_hours", account_span_hours)
+    update_server_data(guild_id, "raid_action", action_value)
+    update_server_data(guild_id, "raid_quarantine_role_id", quarantine_role.id if quarantine_role else None)
+    update_server_data(guild_id, "raid_auto_lockdown", auto_lockdown)
+
+    embed = discord.Embed(title="🛡️ Détection de raid", description=f"{joins} arrivées en {seconds}s", color=0x00ff00)
+    embed.add_field(name="Écart de création max", value=f"{account_span_hours}h" if account_span_hours else "Non utilisé")
+    embed.add_field(name="Action", value=action_value)
+    embed.add_field(name="Verrouillage auto", value="Oui" if auto_lockdown else "Non")
+    await interaction.response.send_message(embed=embed)
+
+@config_group.command(name="warns", description="Configurer l'expiration des avertissements et le ban automatique")
+async def warns_config(interaction: discord.Interaction, decay_days: int = 0, ban_threshold: int = 3):
+    guild_id = interaction.guild.id
+    if decay_days < 0 or ban_threshold < 0:
+        return await interaction.response.send_message("❌ Valeurs invalides", ephemeral=True)
+
+    update_server_data(guild_id, "warn_decay_days", decay_days)
+    update_server_data(guild_id, "warn_ban_threshold", ban_threshold)
+
+    embed = discord.Embed(title="⚠️ Avertissements", color=0x00ff00)
+    embed.add_field(name="Expiration", value=f"{decay_days} jours" if decay_days else "Jamais")
+    embed.add_field(name="Ban automatique", value=f"À {ban_threshold} warns actifs" if ban_threshold else "Désactivé")
+    await interaction.response.send_message(embed=embed)
+
+@config_group.command(name="exempt", description="Exempter (ou non) un rôle ou un canal de l'automodération")
+async def exempt_config(interaction: discord.Interaction, role: discord.Role = None, channel: discord.TextChannel = None, remove: bool = False):
+    guild_id = interaction.guild.id
+    data = get_server_data(guild_id)
+    for key, target in (("automod_exempt_roles", role), ("automod_exempt_channels", channel)):
+        if target is None:
+            continue
+        ids = data[key]
+        if remove and target.id in ids:
+            ids.remove(target.id)
+        elif not remove and target.id not in ids:
+            ids.append(target.id)
+    save_server_data(guild_id, data)
+
+    roles = ", ".join(f"<@&{role_id}>" for role_id in data["automod_exempt_roles"]) or "Aucun"
+    channels = ", ".join(f"<#{channel_id}>" for channel_id in data["automod_exempt_channels"]) or "Aucun"
+    embed = discord.Embed(title="🛡️ Exemptions de l'automodération", color=0x00ff00)
+    embed.add_field(name="Rôles", value=roles[:1024], inline=False)
+    embed.add_field(name="Canaux", value=channels[:1024], inline=False)
+    await interaction.response.send_message(embed=embed)
+
+@config_group.command(name="broadcast", description="Ajouter ou retirer un canal de la liste de diffusion des annonces")
+async def broadcast_config(interaction: discord.Interaction, channel: discord.TextChannel = None, remove: bool = False):
+    guild_id = interaction.guild.id
+    data = get_server_data(guild_id)
+    ids = data["broadcast_channels"]
+    if channel is not None:
+        if remove and channel.id in ids:
+            ids.remove(channel.id)
+        elif not remove and channel.id not in ids:
+            ids.append(channel.id)
+        save_server_data(guild_id, data)
+
+    channels = ", ".join(f"<#{channel_id}>" for channel_id in ids) or "Aucun"
+    embed = discord.Embed(title="📢 Canaux d'annonce", description=channels[:4096], color=0x00ff00)
+    embed.set_footer(text="Utilisés par les diffusions avec la cible « Canaux d'annonce configurés »")
+    await interaction.response.send_message(embed=embed)
+
+@config_group.command(name="slowmode", description="Configurer le mode lent automatique des canaux")
+async def slowmode_config(interaction: discord.Interaction, enabled: bool = True, high_rate: float = 2.0, low_rate: float = 0.5,
+                          delay_seconds: int = 5, hold_seconds: int = 120):
+    guild_id = interaction.guild.id
+    if not 0 < low_rate < high_rate or not 1 <= delay_seconds <= 21600 or hold_seconds < 0:
+        return await interaction.response.send_message("❌ Valeurs invalides (il faut 0 < low_rate < high_rate)", ephemeral=True)
+
+    update_server_data(guild_id, "slowmode_auto", enabled)
+    update_server_data(guild_id, "slowmode_high_rate", high_rate)
+    update_server_data(guild_id, "slowmode_low_rate", low_rate)
+    update_server_data(guild_id, "slowmode_delay", delay_seconds)
+    update_server_data(guild_id, "slowmode_hold", hold_seconds)
+
+    status = "✅ Activé" if enabled else "❌ Désactivé"
+    embed = discord.Embed(title="🐢 Mode lent automatique", description=status, color=0x00ff00 if enabled else 0xff0000)
+    embed.add_field(name="Activation", value=f"Au-dessus de {high_rate} messages/s → {delay_seconds}s")
+    embed.add_field(name="Retrait", value=f"Sous {low_rate} messages/s, après {hold_seconds}s minimum")
+    await interaction.response.send_message(embed=embed)
+
+@config_group.command(name="mentions", description="Configurer la limite de mentions par message et cumulée")
+async def mentions_config(interaction: discord.Interaction, max_per_message: int = 5, max_score: int = 15, window_seconds: int = 60,
+                          user_weight: int = 1, role_weight: int = 3, everyone_weight: int = 10):
+    guild_id = interaction.guild.id
+    if max_per_message < 1 or max_score < 0 or window_seconds < 1 or min(user_weight, role_weight, everyone_weight) < 0:
+        return await interaction.response.send_message("❌ Valeurs invalides", ephemeral=True)
+
+    update_server_data(guild_id, "max_mentions", max_per_message)
+    update_server_data(guild_id, "max_mention_score", max_score)
+    update_server_data(guild_id, "mention_window", window_seconds)
+    update_server_data(guild_id, "mention_weight_user", user_weight)
+    update_server_data(guild_id, "mention_weight_role", role_weight)
+    update_server_data(guild_id, "mention_weight_everyone", everyone_weight)
+
+    embed = discord.Embed(title="📣 Limite de mentions", color=0x00ff00)
+    embed.add_field(name="Par message", value=f"{max_per_message} membres max")
+    embed.add_field(name="Cumulée", value=f"Score {max_score} max sur {window_seconds}s" if max_score else "Désactivée")
+    embed.add_field(name="Poids", value=f"Membre {user_weight} • Rôle {role_weight} • @everyone/@here {everyone_weight}", inline=False)
+    await interaction.response.send_message(embed=embed)
+
+@config_group.command(name="flood", description="Configurer la détection de contenu répété en masse")
+async def flood_config(interaction: discord.Interaction, enabled: bool = True, users: int = 5, channels: int = 4, seconds: int = 30):
+    guild_id = interaction.guild.id
+    if users < 2 or channels < 2 or seconds < 1:
+        return await interaction.response.send_message("❌ Valeurs invalides", ephemeral=True)
+
+    update_server_data(guild_id, "flood_protection", enabled)
+    update_server_data(guild_id, "flood_users", users)
+    update_server_data(guild_id, "flood_channels", channels)
+    update_server_data(guild_id, "flood_window", seconds)
+
+    status = "✅ Activée" if enabled else "❌ Désactivée"
+    embed = discord.Embed(title="🧬 Détection de flood", description=status, color=0x00ff00 if enabled else 0xff0000)
+    embed.add_field(name="Seuil", value=f"Même contenu par {users} membres ou dans {channels} canaux en {seconds}s")
+    await interaction.response.send_message(embed=embed)
+
 @admin_group.command(name="addword", description="Ajouter un mot banni")
 async def addword(interaction: discord.Interaction, word: str):
     guild_id = interaction.guild.id
@@ -425,6 +3375,7 @@ async def addword(interaction: discord.Interaction, word: str):
     if word.lower() not in data["banned_words"]:
         data["banned_words"].append(word.lower())
         save_server_data(guild_id, data)
+        invalidate_word_matcher(guild_id)
         embed = discord.Embed(title="🚫 Mot ajouté", description=f"'{word}' ajouté aux mots bannis", color=0xff6b6b)
     else:
         embed = discord.Embed(title="❌ Erreur", description="Ce mot est déjà banni", color=0xff0000)
@@ -439,12 +3390,27 @@ async def removeword(interaction: discord.Interaction, word: str):
     if word.lower() in data["banned_words"]:
         data["banned_words"].remove(word.lower())
         save_server_data(guild_id, data)
+        invalidate_word_matcher(guild_id)
         embed = discord.Embed(title="✅ Mot retiré", description=f"'{word}' retiré des mots bannis", color=0x00ff00)
     else:
         embed = discord.Embed(title="❌ Erreur", description="Ce mot n'est pas dans la liste", color=0xff0000)
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+@config_group.command(name="wordfilter", description="Choisir le mode de détection des mots bannis")
+async def wordfilter(interaction: discord.Interaction, word_boundary: bool = False, confusables: bool = False, leet: bool = False):
+    guild_id = interaction.guild.id
+    update_server_data(guild_id, "word_filter_boundary", word_boundary)
+    update_server_data(guild_id, "word_filter_confusables", confusables)
+    update_server_data(guild_id, "word_filter_leet", leet)
+    invalidate_word_matcher(guild_id)
+
+    embed = discord.Embed(title="🚫 Filtre de mots", color=0x00ff00)
+    embed.add_field(name="Mots entiers", value="Oui" if word_boundary else "Non")
+    embed.add_field(name="Caractères similaires", value="Oui" if confusables else "Non")
+    embed.add_field(name="Leetspeak", value="Oui" if leet else "Non")
+    await interaction.response.send_message(embed=embed)
+
 @admin_group.command(name="bannedwords", description="Voir la liste des mots bannis")
 async def bannedwords(interaction: discord.Interaction):
     guild_id = interaction.guild.id
@@ -458,99 +3424,78 @@ async def bannedwords(interaction: discord.Interaction):
 
 # COMMANDES SYSTÈME
 @admin_group.command(name="maintenance", description="Mode maintenance ON")
-async def maintenance_on(interaction: discord.Interaction, reason: str = "Maintenance"):
+@app_commands.choices(mode=LOCKDOWN_MODES, target=BROADCAST_TARGETS)
+async def maintenance_on(interaction: discord.Interaction, reason: str = "Maintenance", mode: app_commands.Choice[str] = None,
+                         target: app_commands.Choice[str] = None, category: discord.CategoryChannel = None):
     guild_id = interaction.guild.id
     update_server_data(guild_id, "maintenance_mode", True)
     update_server_data(guild_id, "maintenance_reason", reason)
+    MAINTENANCE_NOTIFIED.discard_where(lambda key: key[0] == guild_id)
 
     await interaction.response.send_message("🔧 **INITIALISATION DU MODE MAINTENANCE...**", ephemeral=True)
 
     try:
-        # Créer l'embed cinématique de maintenance
-        maintenance_embed = discord.Embed(
-            title="🚧 ⚠️ **MAINTENANCE EN COURS** ⚠️ 🚧",
-            description=f"```diff\n- SERVEUR EN MAINTENANCE TECHNIQUE\n- ACCÈS UTILISATEUR SUSPENDU\n- INTERVENTIONS ADMINISTRATIVES EN COURS\n```\n\n**🔧 RAISON:** `{reason}`\n**⚙️ STATUT:** `MAINTENANCE ACTIVE`\n**⏰ DÉBUT:** <t:{int(datetime.now().timestamp())}:F>\n**👨‍💻 TECHNICIEN:** {interaction.user.mention}",
-            color=0xffa500
+        # Embed cinématique de maintenance (modèle précompilé)
+        maintenance_embed = MAINTENANCE_TEMPLATE.render(reason=reason, moderator=interaction.user.mention)
+
+        # Fermer l'envoi de messages par les permissions (instantané séparé de celui du lockdown)
+        progress = ProgressReporter(interaction, "🔧 **FERMETURE DES CANAUX...**")
+        closed, failed = await lock_guild(
+            interaction.guild,
+            mode=mode.value if mode else "channels",
+            snapshot_key="maintenance_snapshot",
+            reason=f"Maintenance par {interaction.user}: {reason}",
+            on_progress=progress
         )
-        maintenance_embed.set_image(url="https://media.giphy.com/media/3oKIPnAiaMCws8nOsE/giphy.gif")
-        maintenance_embed.set_thumbnail(url="https://media.giphy.com/media/xTiTnHXbRoaZ1B1Mo8/giphy.gif")
-        maintenance_embed.add_field(
-            name="⚙️ **OPÉRATIONS EN COURS**",
-            value="```yaml\n🔧 Maintenance système active\n🛠️ Interventions techniques\n🔄 Optimisations serveur\n⏸️ Communications suspendues```",
-            inline=False
-        )
-        maintenance_embed.add_field(
-            name="🚫 **RESTRICTIONS ACTIVES**",
-            value="```css\n[BLOQUÉ] Messages utilisateurs\n[AUTORISÉ] Communications admin\n[ACTIF] Surveillance système\n[STANDBY] Fonctions normales```",
-            inline=False
-        )
-        maintenance_embed.add_field(
-            name="📋 **INFORMATIONS**",
-            value=f"```fix\nDurée estimée: En cours d'évaluation\nImpact: Communications temporairement suspendues\nContact: Équipe administrative disponible```",
-            inline=False
-        )
-        maintenance_embed.set_footer(text="🔧 SYSTÈME DE MAINTENANCE ASTRAL | MODE TECHNIQUE ACTIVÉ", icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png")
-
-        # Envoyer dans tous les canaux texte
-        for channel in interaction.guild.text_channels:
-            try:
-                await channel.send("🚧" * 10)
-                await channel.send(embed=maintenance_embed)
-                await channel.send("⚙️" * 10)
-            except:
-                pass
 
         # Confirmer dans le canal de commande
-        await interaction.followup.send(f"✅ **MODE MAINTENANCE ACTIVÉ** - Serveur en maintenance technique", ephemeral=True)
+        await interaction.followup.send(f"✅ **MODE MAINTENANCE ACTIVÉ** - {closed} canaux fermés, {failed} échecs", ephemeral=True)
+
+        # Annoncer dans les canaux ciblés (un message par canal)
+        channels = broadcast_channels(interaction.guild, target.value if target else "all", category)
+        job = await run_broadcast(interaction, channels, "📢 **ANNONCE DE LA MAINTENANCE...**", content="🚧" * 10, embed=maintenance_embed)
+        await interaction.followup.send(job.report(), ephemeral=True)
 
     except Exception as e:
         await interaction.followup.send("❌ Erreur lors de l'activation maintenance", ephemeral=True)
 
 @admin_group.command(name="maintenance_off", description="Mode maintenance OFF")
-async def maintenance_off(interaction: discord.Interaction):
+@app_commands.choices(target=BROADCAST_TARGETS)
+async def maintenance_off(interaction: discord.Interaction, target: app_commands.Choice[str] = None, category: discord.CategoryChannel = None):
     guild_id = interaction.guild.id
+    data = get_server_data(guild_id)
+    if not data["maintenance_mode"] and not data["maintenance_snapshot"]:
+        return await interaction.response.send_message("ℹ️ Aucune maintenance active : aucune permission modifiée", ephemeral=True)
     update_server_data(guild_id, "maintenance_mode", False)
+    MAINTENANCE_NOTIFIED.discard_where(lambda key: key[0] == guild_id)
 
     await interaction.response.send_message("✅ **FINALISATION DE LA MAINTENANCE...**", ephemeral=True)
 
     try:
-        # Créer l'embed cinématique de fin de maintenance
-        end_maintenance_embed = discord.Embed(
-            title="🎉 ✨ **MAINTENANCE TERMINÉE** ✨ 🎉",
-            description=f"```diff\n+ MAINTENANCE TECHNIQUE COMPLÉTÉE\n+ SERVEUR PLEINEMENT OPÉRATIONNEL\n+ COMMUNICATIONS RÉTABLIES\n```\n\n**✅ STATUT:** `OPÉRATIONNEL`\n**⏰ FIN:** <t:{int(datetime.now().timestamp())}:F>\n**👨‍💻 TECHNICIEN:** {interaction.user.mention}\n**🔄 RÉSULTAT:** `Maintenance réussie - Système optimisé`",
-            color=0x00ff66
-        )
-        end_maintenance_embed.set_image(url="https://media.giphy.com/media/26u4cqiYI30juCOGY/giphy.gif")
-        end_maintenance_embed.set_thumbnail(url="https://media.giphy.com/media/3o7abKhOpu0NwenH3O/giphy.gif")
-        end_maintenance_embed.add_field(
-            name="🎊 **MAINTENANCE RÉUSSIE**",
-            value="```yaml\n✅ Système entièrement opérationnel\n✅ Communications restaurées\n✅ Optimisations appliquées\n✅ Serveur stabilisé```",
-            inline=False
+        # Embed cinématique de fin de maintenance (modèle précompilé)
+        end_maintenance_embed = MAINTENANCE_END_TEMPLATE.render(moderator=interaction.user.mention)
+
+        # Rouvrir les canaux avec les permissions sauvegardées à l'activation
+        held_by = other_active_lock(get_server_data(guild_id), "maintenance_snapshot")
+        progress = ProgressReporter(interaction, "✅ **RÉOUVERTURE DES CANAUX...**")
+        reopened, failed = await unlock_guild(
+            interaction.guild,
+            snapshot_key="maintenance_snapshot",
+            reason=f"Fin de maintenance par {interaction.user}",
+            on_progress=progress
         )
-        end_maintenance_embed.add_field(
-            name="🌟 **AMÉLIORATIONS APPORTÉES**",
-            value="```css\n[OPTIMISÉ] Performances système\n[SÉCURISÉ] Protocoles de sécurité\n[STABLE] Fonctionnement optimal\n[DISPONIBLE] Toutes fonctionnalités```",
-            inline=False
-        )
-        end_maintenance_embed.add_field(
-            name="📢 **ANNONCE**",
-            value="```fix\nLe serveur est maintenant pleinement fonctionnel !\nMerci de votre patience pendant la maintenance.\nToutes les fonctionnalités sont disponibles.```",
-            inline=False
-        )
-        end_maintenance_embed.set_footer(text="✅ SYSTÈME DE MAINTENANCE ASTRAL | SERVEUR OPÉRATIONNEL", icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png")
-
-        # Envoyer dans tous les canaux texte
-        for channel in interaction.guild.text_channels:
-            try:
-                await channel.send("🎉" * 10)
-                await channel.send(embed=end_maintenance_embed)
-                await channel.send("🎊" * 10)
-                await channel.send("**🚀 LE SERVEUR EST DE RETOUR ! BIENVENUE ! 🚀**")
-            except:
-                pass
 
         # Confirmer dans le canal de commande
-        await interaction.followup.send(f"✅ **MAINTENANCE TERMINÉE** - Serveur pleinement opérationnel", ephemeral=True)
+        await interaction.followup.send(f"✅ **MAINTENANCE TERMINÉE** - {reopened} canaux rouverts, {failed} échecs", ephemeral=True)
+        if held_by:
+            return await interaction.followup.send(
+                f"ℹ️ Le {LOCK_SNAPSHOT_KEYS[held_by]} reste actif : les canaux restent fermés jusqu'au déverrouillage", ephemeral=True)
+
+        # Annoncer dans les canaux ciblés (un message par canal)
+        channels = broadcast_channels(interaction.guild, target.value if target else "all", category)
+        job = await run_broadcast(interaction, channels, "📢 **ANNONCE DE LA RÉOUVERTURE...**",
+                                  content="🎉" * 10 + "\n**🚀 LE SERVEUR EST DE RETOUR ! BIENVENUE ! 🚀**", embed=end_maintenance_embed)
+        await interaction.followup.send(job.report(), ephemeral=True)
 
     except Exception as e:
         await interaction.followup.send("❌ Erreur lors de la fin de maintenance", ephemeral=True)
@@ -559,10 +3504,137 @@ async def maintenance_off(interaction: discord.Interaction):
 async def setlogchannel(interaction: discord.Interaction, channel: discord.TextChannel):
     guild_id = interaction.guild.id
     update_server_data(guild_id, "log_channel_id", channel.id)
+    LOG_DISPATCHER.invalidate_channel(guild_id)
 
     embed = discord.Embed(title="📝 Canal de logs défini", description=f"Logs dans {channel.mention}", color=0x0099ff)
     await interaction.response.send_message(embed=embed)
 
+@ops_group.command(name="stats", description="Latences (p50/p99) et taux d'erreur du bot")
+async def stats(interaction: discord.Interaction):
+    def summarize(metric, label, errors_metric):
+        rows = []
+        for (name, labels), histogram in METRICS.histograms.items():
+            if name != metric:
+                continue
+            key = dict(labels)[label]
+            errors = METRICS.counter(errors_metric, **dict(labels))
+            rows.append((histogram.count, key, histogram.quantile(0.5) * 1000, histogram.quantile(0.99) * 1000, errors))
+        rows.sort(reverse=True)
+        lines = [f"{key[:22]:<22} {count:>7} {p50:>8.1f} {p99:>8.1f} {100 * errors / count:>5.1f}%" for count, key, p50, p99, errors in rows[:15]]
+        header = f"{'':<22} {'appels':>7} {'p50 ms':>8} {'p99 ms':>8} {'err':>6}"
+        # Limite de 1024 caractères par champ : les lignes en trop sont retirées, pas coupées
+        while lines and len(header) + sum(len(line) + 1 for line in lines) + 8 > 1024:
+            lines.pop()
+        return "```\n" + "\n".join([header] + lines) + "\n```" if lines else "Aucune donnée"
+
+    embed = discord.Embed(title="📈 Statistiques du bot", color=0x0099ff)
+    embed.add_field(name="Évènements", value=summarize("event_seconds", "event", "event_errors_total"), inline=False)
+    embed.add_field(name="Étapes de on_message", value=summarize("on_message_stage_seconds", "stage", "on_message_stage_errors_total"), inline=False)
+    embed.add_field(name="Commandes", value=summarize("command_seconds", "command", "command_errors_total"), inline=False)
+    cache = SERVER_DATA.stats()
+    embed.add_field(name="Cache", value=f"{cache['size']}/{cache['max_entries']} serveurs, {cache['hits']} hits, {cache['misses']} misses")
+    embed.add_field(name="Sauvegardes", value=f"{SAVE_STATS['writes']} écritures, {SAVE_STATS['coalesced']} regroupées")
+    embed.add_field(name="Latence gateway", value=f"{bot.latency * 1000:.0f} ms")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@ops_group.command(name="purge", description="Purger en masse les messages de plusieurs canaux, avec filtres")
+async def purge(interaction: discord.Interaction, channel: discord.TextChannel = None, category: discord.CategoryChannel = None,
+                all_channels: bool = False, limit: int = 1000, user: discord.User = None, bots_only: bool = False,
+                contains: str = None, regex: str = None, attachments_only: bool = False,
+                last_hours: int = 0, older_than_hours: int = 0):
+    guild = interaction.guild
+    if guild.id in PURGE_JOBS:
+        return await interaction.response.send_message("❌ Une purge est déjà en cours (`/ops purge_cancel` pour l'arrêter)", ephemeral=True)
+    if limit < 1 or last_hours < 0 or older_than_hours < 0:
+        return await interaction.response.send_message("❌ Valeurs invalides", ephemeral=True)
+    try:
+        purge_filter = PurgeFilter(user.id if user else None, bots_only, contains, regex, attachments_only)
+    except re.error as e:
+        return await interaction.response.send_message(f"❌ Expression régulière invalide: {e}", ephemeral=True)
+
+    if all_channels:
+        channels = list(guild.text_channels)
+    elif category is not None:
+        channels = list(category.text_channels)
+    else:
+        channels = [channel or interaction.channel]
+
+    now = discord.utils.utcnow()
+    after = now - timedelta(hours=last_hours) if last_hours else None
+    before = now - timedelta(hours=older_than_hours) if older_than_hours else None
+
+    await interaction.response.send_message(f"🧹 **PURGE EN COURS** sur {len(channels)} canaux...", ephemeral=True)
+    progress = ProgressReporter(interaction, "🧹 **PURGE EN COURS...**")
+    job = PURGE_JOBS[guild.id] = PurgeJob(channels, purge_filter, limit, after=after, before=before, on_progress=progress.update)
+    started = time.monotonic()
+    try:
+        stats = await job.run()
+    finally:
+        PURGE_JOBS.pop(guild.id, None)
+    await progress.update(job.status(), final=True)
+
+    cancelled = job.cancelled.is_set()
+    embed = discord.Embed(
+        title="🧹 Purge annulée" if cancelled else "🧹 Purge terminée",
+        description=job.status(),
+        color=0xff9900 if cancelled else 0x00ff00
+    )
+    embed.add_field(name="Canaux", value=f"{len(channels)} ({stats['failed_channels']} en erreur)")
+    embed.add_field(name="Durée", value=f"{time.monotonic() - started:.0f}s")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+    log_event(guild, embed)
+
+@ops_group.command(name="purge_cancel", description="Arrêter la purge en cours")
+async def purge_cancel(interaction: discord.Interaction):
+    job = PURGE_JOBS.get(interaction.guild.id)
+    if job is None:
+        return await interaction.response.send_message("ℹ️ Aucune purge en cours", ephemeral=True)
+    job.cancel()
+    await interaction.response.send_message(f"🛑 Purge en cours d'arrêt — {job.status()}", ephemeral=True)
+
+@ops_group.command(name="broadcast_cancel", description="Arrêter la diffusion d'annonce en cours")
+async def broadcast_cancel(interaction: discord.Interaction):
+    job = BROADCAST_JOBS.get(interaction.guild.id)
+    if job is None:
+        return await interaction.response.send_message("ℹ️ Aucune diffusion en cours", ephemeral=True)
+    job.cancel()
+    await interaction.response.send_message(f"🛑 Diffusion en cours d'arrêt — {job.status()}", ephemeral=True)
+
+@ops_group.command(name="shards", description="État de santé de chaque shard")
+async def shards(interaction: discord.Interaction):
+    if not SHARD_COUNT:
+        await interaction.response.send_message(
+            f"ℹ️ Mode non shardé: une seule connexion, latence {bot.latency * 1000:.0f} ms", ephemeral=True)
+        return
+
+    # État publié par les autres processus, complété par l'état en direct de celui-ci
+    loop = asyncio.get_running_loop()
+    statuses = {s["worker"]: s for s in await loop.run_in_executor(STORAGE_EXECUTOR, read_shard_statuses)}
+    statuses[WORKER_ID] = SHARD_HEALTH.snapshot()
+
+    now = time.time()
+    lines = []
+    problems = 0
+    for worker_id, status in sorted(statuses.items()):
+        stale = now - status["updated"] > SHARD_STALE_AFTER
+        for shard in status["shards"]:
+            state = "muet" if stale else shard["state"]
+            latency = "-" if shard["latency_ms"] is None else f"{shard['latency_ms']}"
+            if stale or state != "prêt":
+                problems += 1
+            lines.append(f"{shard['shard_id']:>5} {worker_id:>5} {state:<11} {latency:>7} {shard['guilds']:>8} {shard['disconnects']:>5}")
+
+    header = f"{'shard':>5} {'proc':>5} {'état':<11} {'lat ms':>7} {'serveurs':>8} {'déco':>5}"
+    embed = discord.Embed(
+        title="🧩 État des shards",
+        description="```\n" + "\n".join([header] + lines)[:4000] + "\n```",
+        color=0xff9900 if problems else 0x00ff00
+    )
+    embed.add_field(name="Shards", value=f"{sum(len(s['shards']) for s in statuses.values())}/{SHARD_COUNT}")
+    embed.add_field(name="En difficulté", value=str(problems))
+    embed.add_field(name="Ce serveur", value=f"shard {interaction.guild.shard_id}, processus {WORKER_ID}")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 @bot.tree.command(name="serverinfo", description="Informations du serveur")
 async def serverinfo(interaction: discord.Interaction):
     guild = interaction.guild
@@ -600,9 +3672,10 @@ async def userinfo(interaction: discord.Interaction, member: discord.Member = No
 @admin_group.command(name="say", description="Faire parler le bot")
 async def say(interaction: discord.Interaction, message: str, channel: discord.TextChannel = None):
     target_channel = channel or interaction.channel
+    await interaction.response.defer(ephemeral=True)
 
     try:
-        await target_channel.send(message)
+        await REST_SCHEDULER.call("announce", ("send", target_channel.id), lambda: target_channel.send(message))
         embed = discord.Embed(
             title="✅ Message envoyé",
             description=f"Message envoyé dans {target_channel.mention}",
@@ -612,32 +3685,28 @@ async def say(interaction: discord.Interaction, message: str, channel: discord.T
         embed.add_field(name="Expéditeur", value=interaction.user.mention, inline=True)
         embed.add_field(name="Canal", value=target_channel.mention, inline=True)
 
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
         # Log dans le canal de logs si configuré
-        guild_id = interaction.guild.id
-        data = get_server_data(guild_id)
-        log_channel_id = data["log_channel_id"]
-        
-        if log_channel_id:
-            log_channel = bot.get_channel(log_channel_id)
-            if log_channel and log_channel != target_channel:
-                log_embed = discord.Embed(
-                    title="📤 Message bot envoyé",
-                    description=f"Message envoyé via le bot dans {target_channel.mention}",
-                    color=0x0099ff
-                )
-                log_embed.add_field(name="Contenu", value=f"```{message[:1000]}```", inline=False)
-                log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
-                log_embed.add_field(name="Heure", value=f"<t:{int(datetime.now().timestamp())}:F>", inline=True)
-                await log_channel.send(embed=log_embed)
+        log_channel = LOG_DISPATCHER.get_channel(interaction.guild.id)
+        if log_channel and log_channel != target_channel:
+            log_embed = discord.Embed(
+                title="📤 Message bot envoyé",
+                description=f"Message envoyé via le bot dans {target_channel.mention}",
+                color=0x0099ff
+            )
+            log_embed.add_field(name="Contenu", value=f"```{message[:1000]}```", inline=False)
+            log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
+            log_embed.add_field(name="Heure", value=f"<t:{int(datetime.now().timestamp())}:F>", inline=True)
+            log_event(interaction.guild, log_embed)
 
     except Exception as e:
-        await interaction.response.send_message(f"❌ Erreur lors de l'envoi: {str(e)}", ephemeral=True)
+        await interaction.followup.send(f"❌ Erreur lors de l'envoi: {describe_send_error(e)}", ephemeral=True)
 
 @admin_group.command(name="embed", description="Envoyer un message embed via le bot")
 async def send_embed(interaction: discord.Interaction, title: str, description: str, channel: discord.TextChannel = None, color: str = "0x0099ff"):
     target_channel = channel or interaction.channel
+    await interaction.response.defer(ephemeral=True)
 
     try:
         # Convertir la couleur
@@ -654,7 +3723,7 @@ async def send_embed(interaction: discord.Interaction, title: str, description:
         )
         embed.set_footer(text=f"Message officiel • {interaction.guild.name}")
 
-        await target_channel.send(embed=embed)
+        await REST_SCHEDULER.call("announce", ("send", target_channel.id), lambda: target_channel.send(embed=embed))
 
         # Confirmation
         confirm_embed = discord.Embed(
@@ -666,32 +3735,37 @@ async def send_embed(interaction: discord.Interaction, title: str, description:
         confirm_embed.add_field(name="Description", value=description[:1000], inline=False)
         confirm_embed.add_field(name="Expéditeur", value=interaction.user.mention, inline=True)
 
-        await interaction.response.send_message(embed=confirm_embed, ephemeral=True)
+        await interaction.followup.send(embed=confirm_embed, ephemeral=True)
 
         # Log
-        guild_id = interaction.guild.id
-        data = get_server_data(guild_id)
-        log_channel_id = data["log_channel_id"]
-        
-        if log_channel_id:
-            log_channel = bot.get_channel(log_channel_id)
-            if log_channel and log_channel != target_channel:
-                log_embed = discord.Embed(
-                    title="📤 Embed bot envoyé",
-                    description=f"Embed envoyé via le bot dans {target_channel.mention}",
-                    color=0x0099ff
-                )
-                log_embed.add_field(name="Titre", value=title, inline=False)
-                log_embed.add_field(name="Description", value=description[:1000], inline=False)
-                log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
-                await log_channel.send(embed=log_embed)
+        log_channel = LOG_DISPATCHER.get_channel(interaction.guild.id)
+        if log_channel and log_channel != target_channel:
+            log_embed = discord.Embed(
+                title="📤 Embed bot envoyé",
+                description=f"Embed envoyé via le bot dans {target_channel.mention}",
+                color=0x0099ff
+            )
+            log_embed.add_field(name="Titre", value=title, inline=False)
+            log_embed.add_field(name="Description", value=description[:1000], inline=False)
+            log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
+            log_event(interaction.guild, log_embed)
 
     except Exception as e:
-        await interaction.response.send_message(f"❌ Erreur lors de l'envoi: {str(e)}", ephemeral=True)
+        await interaction.followup.send(f"❌ Erreur lors de l'envoi: {describe_send_error(e)}", ephemeral=True)
 
 @admin_group.command(name="announce", description="Envoyer une annonce officielle")
-async def announce(interaction: discord.Interaction, title: str, message: str, channel: discord.TextChannel = None, ping_everyone: bool = False):
-    target_channel = channel or interaction.channel
+@app_commands.choices(target=BROADCAST_TARGETS)
+async def announce(interaction: discord.Interaction, title: str, message: str, channel: discord.TextChannel = None, ping_everyone: bool = False,
+                   target: app_commands.Choice[str] = None, category: discord.CategoryChannel = None):
+    # Un seul canal (indiqué ou actuel), ou diffusion vers un ensemble de canaux
+    if target is None:
+        channels = [channel or interaction.channel]
+    else:
+        channels = broadcast_channels(interaction.guild, target.value, category)
+    if not channels:
+        return await interaction.response.send_message("❌ Aucun canal ciblé", ephemeral=True)
+    where = channels[0].mention if len(channels) == 1 else f"{len(channels)} canaux"
+    await interaction.response.send_message("📢 **PUBLICATION DE L'ANNONCE...**", ephemeral=True)
 
     try:
         # Créer l'embed d'annonce
@@ -707,49 +3781,42 @@ async def announce(interaction: discord.Interaction, title: str, message: str, c
         # Ajouter une image d'annonce
         announce_embed.set_thumbnail(url="https://media.giphy.com/media/l0HlQoLBxzlnKRT8s/giphy.gif")
 
-        # Envoyer avec ou sans ping
-        content = "@everyone" if ping_everyone else ""
-
-        await target_channel.send("🔔" * 10)
-        await target_channel.send(content=content, embed=announce_embed)
-        await target_channel.send("🔔" * 10)
+        # Envoyer avec ou sans ping, un message par canal
+        content = ("@everyone " if ping_everyone else "") + "🔔" * 10
+        job = await run_broadcast(interaction, channels, "📢 **PUBLICATION DE L'ANNONCE...**", content=content, embed=announce_embed)
 
         # Confirmation
         confirm_embed = discord.Embed(
-            title="✅ Annonce publiée",
-            description=f"Annonce envoyée dans {target_channel.mention}",
-            color=0x00ff00
+            title="✅ Annonce publiée" if job.sent else "❌ Annonce non publiée",
+            description=f"Annonce envoyée dans {where}",
+            color=0x00ff00 if job.sent else 0xff0000
         )
         confirm_embed.add_field(name="Titre", value=title, inline=False)
         confirm_embed.add_field(name="Message", value=message[:1000], inline=False)
         confirm_embed.add_field(name="Ping everyone", value="Oui" if ping_everyone else "Non", inline=True)
 
-        await interaction.response.send_message(embed=confirm_embed, ephemeral=True)
+        await interaction.followup.send(content=job.report(), embed=confirm_embed, ephemeral=True)
 
         # Log
-        guild_id = interaction.guild.id
-        data = get_server_data(guild_id)
-        log_channel_id = data["log_channel_id"]
-        
-        if log_channel_id:
-            log_channel = bot.get_channel(log_channel_id)
-            if log_channel and log_channel != target_channel:
-                log_embed = discord.Embed(
-                    title="📢 Annonce officielle publiée",
-                    description=f"Annonce publiée dans {target_channel.mention}",
-                    color=0xffd700
-                )
-                log_embed.add_field(name="Titre", value=title, inline=False)
-                log_embed.add_field(name="Message", value=message[:1000], inline=False)
-                log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
-                log_embed.add_field(name="Ping everyone", value="Oui" if ping_everyone else "Non", inline=True)
-                await log_channel.send(embed=log_embed)
+        log_channel = LOG_DISPATCHER.get_channel(interaction.guild.id)
+        if log_channel and log_channel not in channels:
+            log_embed = discord.Embed(
+                title="📢 Annonce officielle publiée",
+                description=f"Annonce publiée dans {where}",
+                color=0xffd700
+            )
+            log_embed.add_field(name="Titre", value=title, inline=False)
+            log_embed.add_field(name="Message", value=message[:1000], inline=False)
+            log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
+            log_embed.add_field(name="Ping everyone", value="Oui" if ping_everyone else "Non", inline=True)
+            log_event(interaction.guild, log_embed)
 
     except Exception as e:
-        await interaction.response.send_message(f"❌ Erreur lors de l'envoi: {str(e)}", ephemeral=True)
+        await interaction.followup.send(f"❌ Erreur lors de l'envoi: {str(e)}", ephemeral=True)
 
 @admin_group.command(name="dm", description="Envoyer un MP à un utilisateur via le bot")
 async def send_dm(interaction: discord.Interaction, member: discord.Member, message: str):
+    await interaction.response.defer(ephemeral=True)
     try:
         # Créer l'embed pour le MP
         dm_embed = discord.Embed(
@@ -761,7 +3828,7 @@ async def send_dm(interaction: discord.Interaction, member: discord.Member, mess
         dm_embed.set_footer(text=f"Message officiel de {interaction.guild.name}")
         dm_embed.set_author(name=interaction.guild.name, icon_url=interaction.guild.icon.url if interaction.guild.icon else None)
 
-        await member.send(embed=dm_embed)
+        await REST_SCHEDULER.call("dm", ("dm", interaction.guild.id), lambda: member.send(embed=dm_embed))
 
         # Confirmation
         confirm_embed = discord.Embed(
@@ -773,36 +3840,33 @@ async def send_dm(interaction: discord.Interaction, member: discord.Member, mess
         confirm_embed.add_field(name="Destinataire", value=member.mention, inline=True)
         confirm_embed.add_field(name="Expéditeur", value=interaction.user.mention, inline=True)
 
-        await interaction.response.send_message(embed=confirm_embed, ephemeral=True)
+        await interaction.followup.send(embed=confirm_embed, ephemeral=True)
 
         # Log
-        guild_id = interaction.guild.id
-        data = get_server_data(guild_id)
-        log_channel_id = data["log_channel_id"]
-        
-        if log_channel_id:
-            log_channel = bot.get_channel(log_channel_id)
-            if log_channel:
-                log_embed = discord.Embed(
-                    title="📨 MP bot envoyé",
-                    description=f"Message privé envoyé via le bot à {member.mention}",
-                    color=0x0099ff
-                )
-                log_embed.add_field(name="Contenu", value=f"```{message[:1000]}```", inline=False)
-                log_embed.add_field(name="Destinataire", value=member.mention, inline=True)
-                log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
-                await log_channel.send(embed=log_embed)
+        if LOG_DISPATCHER.get_channel(interaction.guild.id):
+            log_embed = discord.Embed(
+                title="📨 MP bot envoyé",
+                description=f"Message privé envoyé via le bot à {member.mention}",
+                color=0x0099ff
+            )
+            log_embed.add_field(name="Contenu", value=f"```{message[:1000]}```", inline=False)
+            log_embed.add_field(name="Destinataire", value=member.mention, inline=True)
+            log_embed.add_field(name="Administrateur", value=interaction.user.mention, inline=True)
+            log_event(interaction.guild, log_embed)
 
     except discord.Forbidden:
-        await interaction.response.send_message(f"❌ Impossible d'envoyer un MP à {member.mention} (MP fermés)", ephemeral=True)
+        await interaction.followup.send(f"❌ Impossible d'envoyer un MP à {member.mention} (MP fermés)", ephemeral=True)
     except Exception as e:
-        await interaction.response.send_message(f"❌ Erreur lors de l'envoi: {str(e)}", ephemeral=True)
+        await interaction.followup.send(f"❌ Erreur lors de l'envoi: {describe_send_error(e)}", ephemeral=True)
 
-@bot.tree.command(name="commands", description="Liste détaillée des commandes")
-async def commands_list(interaction: discord.Interaction):
+# Embeds de /commands, construits une seule fois par niveau de permission
+COMMAND_EMBEDS = {}
+
+def build_command_embeds(admin):
+    """Construit la liste des embeds de /commands pour un niveau de permission"""
     embeds = []
 
-    if interaction.user.guild_permissions.administrator:
+    if admin:
         # Embed 1: Modération de base
         embed1 = discord.Embed(title="🔨 MODÉRATION DE BASE", color=0xff6b6b)
         embed1.add_field(
@@ -832,7 +3896,7 @@ async def commands_list(interaction: discord.Interaction):
         )
         embed1.add_field(
             name="/clear [nombre]",
-            value="Supprimer X messages du canal (max 100)",
+            value=f"Supprimer les X derniers messages du canal (y compris ceux de plus de 14 jours, {CLEAR_MAX_MESSAGES} au plus)",
             inline=False
         )
         embeds.append(embed1)
@@ -841,7 +3905,7 @@ async def commands_list(interaction: discord.Interaction):
         embed2 = discord.Embed(title="⚠️ SYSTÈME D'AVERTISSEMENTS", color=0xffff00)
         embed2.add_field(
             name="/warn [membre] [raison]",
-            value="Donner un avertissement à un membre (ban auto à 3 warns)",
+            value="Donner un avertissement à un membre (ban auto et expiration réglables avec /config warns)",
             inline=False
         )
         embed2.add_field(
@@ -874,8 +3938,8 @@ async def commands_list(interaction: discord.Interaction):
             inline=False
         )
         embed3.add_field(
-            name="/massban [IDs séparés par espaces] [raison]",
-            value="🔨 Bannir plusieurs utilisateurs en une fois avec leurs IDs",
+            name="/massban [IDs séparés par espaces] [fichier] [raison]",
+            value="🔨 Bannir plusieurs utilisateurs en une fois avec leurs IDs (texte ou fichier), rapport CSV",
             inline=False
         )
         embed3.add_field(
@@ -990,7 +4054,7 @@ async def commands_list(interaction: discord.Interaction):
         inline=False
     )
 
-    if interaction.user.guild_permissions.administrator:
+    if admin:
         embed_general.add_field(
             name="🔑 ACCÈS ADMIN",
             value="Vous avez accès à toutes les commandes de modération !",
@@ -1005,118 +4069,182 @@ async def commands_list(interaction: discord.Interaction):
 
     embeds.append(embed_general)
 
-    # Envoyer le premier embed
-    await interaction.response.send_message(embed=embeds[0], ephemeral=True)
+    return embeds
 
-    # Envoyer les autres embeds
-    for embed in embeds[1:]:
-        await interaction.followup.send(embed=embed, ephemeral=True)
+def get_command_embeds(admin):
+    """Retourne les embeds de /commands (construits au premier appel)"""
+    if admin not in COMMAND_EMBEDS:
+        COMMAND_EMBEDS[admin] = build_command_embeds(admin)
+    return COMMAND_EMBEDS[admin]
+
+@bot.tree.command(name="commands", description="Liste détaillée des commandes")
+async def commands_list(interaction: discord.Interaction):
+    embeds = get_command_embeds(interaction.user.guild_permissions.administrator)
+
+    # Un seul message (10 embeds / 6000 caractères max par message)
+    batches = pack_embeds(embeds)
+    await interaction.response.send_message(embeds=batches[0], ephemeral=True)
+    for batch in batches[1:]:
+        await interaction.followup.send(embeds=batch, ephemeral=True)
 
 # ÉVÉNEMENTS DE SÉCURITÉ
 @bot.event
+@instrumented
 async def on_message(message):
-    if message.author == bot.user:
+    # Bots (dont celui-ci) : rien à modérer ; MP : pas de serveur, seulement les commandes
+    if message.author.bot:
+        return
+    if message.guild is None:
+        await bot.process_commands(message)
         return
 
     guild_id = message.guild.id
-    data = get_server_data(guild_id)
-
-    # Bloquer messages en maintenance (sauf admins)
-    if data["maintenance_mode"] and not message.author.guild_permissions.administrator:
-        try:
-            await message.delete()
-            await message.author.send(f"🔧 Serveur en maintenance: {data['maintenance_reason']}")
-        except:
-            pass
+    author = message.author
+    with METRICS.time("on_message_stage_seconds", stage="load"):
+        if guild_id not in SERVER_DATA:
+            await fetch_server_data(guild_id)
+        policy = get_policy(guild_id)
+        if policy.maintenance or policy.automod:
+            admin, exempt = MEMBER_EXEMPTIONS.get(author, policy)
+
+    # Maintenance : les permissions bloquent l'envoi ; suppression seulement pour ce qui passe encore (sauf admins)
+    if policy.maintenance and not admin:
+        METRICS.inc("maintenance_deletions_total")
+        with METRICS.time("on_message_stage_seconds", stage="maintenance"):
+            REST_SCHEDULER.submit("delete", guild_id, author.id, message.delete, route=("delete", message.channel.id))
+            if MAINTENANCE_NOTIFIED.add((guild_id, author.id)):
+                reason = policy.maintenance_reason
+                REST_SCHEDULER.submit("dm", guild_id, author.id, lambda: author.send(f"🔧 Serveur en maintenance: {reason}"))
         return
 
-    # Automodération
-    if data["automod_enabled"] and not message.author.guild_permissions.administrator:
+    # Débit du canal : mode lent automatique en cas d'emballement
+    channel = message.channel
+    if policy.slowmode:
+        SLOWMODE.record(channel, policy)
+
+    # Automodération (les sanctions passent par la file de modération)
+    if (policy.automod and not exempt and channel.id not in policy.exempt_channels
+            and getattr(channel, "parent_id", None) not in policy.exempt_channels):
+        RECENT_MESSAGES.record(message)
         # Vérifier mots bannis
-        content_lower = message.content.lower()
-        for word in data["banned_words"]:
-            if word in content_lower:
-                await message.delete()
-                try:
-                    await message.author.send(f"⚠️ Message supprimé: mot interdit détecté")
-                except:
-                    pass
+        with METRICS.time("on_message_stage_seconds", stage="banned_words"):
+            banned_word = policy.word_matcher.find(message.content)
+        if banned_word:
+            METRICS.inc("automod_actions_total", reason="banned_word")
+            with METRICS.time("on_message_stage_seconds", stage="moderation"):
+                REST_SCHEDULER.submit("delete", guild_id, author.id, message.delete, route=("delete", message.channel.id))
+                REST_SCHEDULER.submit("dm", guild_id, author.id, lambda: author.send(f"⚠️ Message supprimé: mot interdit détecté"),
+                                      window=60, incident="banned_word")
+            return
+
+        # Même contenu posté par plusieurs comptes ou dans plusieurs canaux
+        if policy.flood:
+            with METRICS.time("on_message_stage_seconds", stage="content_flood"):
+                group = FLOOD_DETECTOR.check(message, policy.flood_window, policy.flood_users, policy.flood_channels)
+                if group is not None:
+                    handle_content_flood(message, group, policy.flood_window)
+            if group is not None:
                 return
 
-        # Anti-spam
-        user_id = str(message.author.id)
-        now = datetime.now()
-
-        if user_id not in data["anti_spam"]:
-            data["anti_spam"][user_id] = []
-
-        # Nettoyer les anciens messages (plus d'1 minute) - convertir en timestamps
-        current_messages = []
-        for msg_time_str in data["anti_spam"][user_id]:
-            try:
-                msg_time = datetime.fromisoformat(msg_time_str)
-                if (now - msg_time).seconds < 60:
-                    current_messages.append(msg_time_str)
-            except:
-                continue
-        
-        data["anti_spam"][user_id] = current_messages
-
-        # Ajouter ce message
-        data["anti_spam"][user_id].append(now.isoformat())
-        
-        # Sauvegarder les données mises à jour
-        save_server_data(guild_id, data)
-
-        # Vérifier spam
-        if len(data["anti_spam"][user_id]) > data["max_messages_per_minute"]:
-            try:
-                await message.author.timeout(datetime.now() + timedelta(minutes=5), reason="Spam détecté")
-                await message.channel.send(f"🔇 {message.author.mention} timeout pour spam (5min)")
-            except:
-                pass
-
-        # Vérifier mentions excessives
-        if len(message.mentions) > data["max_mentions"]:
-            await message.delete()
-            try:
-                await message.author.timeout(datetime.now() + timedelta(minutes=2), reason="Mentions excessives")
-            except:
-                pass
+        # Anti-spam (compteur en mémoire, non sauvegardé)
+        with METRICS.time("on_message_stage_seconds", stage="anti_spam"):
+            message_count = SPAM_COUNTER.hit((guild_id, author.id), policy.spam_window)
+
+        # Vérifier spam : un seul timeout et une seule annonce pendant la durée du timeout
+        if message_count > policy.max_messages:
+            METRICS.inc("automod_actions_total", reason="spam")
+            with METRICS.time("on_message_stage_seconds", stage="moderation"):
+                REST_SCHEDULER.submit("timeout", guild_id, author.id,
+                                      lambda: author.timeout(datetime.now() + timedelta(minutes=5), reason="Spam détecté"),
+                                      window=300, incident="spam")
+                REST_SCHEDULER.submit("notice", guild_id, author.id,
+                                      lambda: channel.send(f"🔇 {author.mention} timeout pour spam (5min)"),
+                                      window=300, incident="spam", route=("send", channel.id))
+                schedule_cleanup(message.guild, author.id, policy.cleanup_seconds)
+
+        # Vérifier mentions excessives : dans ce message, ou cumulées (pondérées) sur la fenêtre
+        mention_score = 0
+        if message.mentions or message.role_mentions or message.mention_everyone or "@" in message.content:
+            user_weight, role_weight, everyone_weight = policy.mention_weights
+            weight = user_weight * len(message.mentions) + role_weight * len(message.role_mentions)
+            # Compté même si l'auteur n'a pas la permission de notifier tout le monde
+            if message.mention_everyone or "@everyone" in message.content or "@here" in message.content:
+                weight += everyone_weight
+            if weight:
+                with METRICS.time("on_message_stage_seconds", stage="mentions"):
+                    mention_score = MENTION_COUNTER.hit((guild_id, author.id), policy.mention_window, weight)
+        if len(message.mentions) > policy.max_mentions or (policy.max_mention_score and mention_score > policy.max_mention_score):
+            METRICS.inc("automod_actions_total", reason="mentions")
+            with METRICS.time("on_message_stage_seconds", stage="moderation"):
+                # Le message en cours fait partie du nettoyage (ou d'un nettoyage déjà en file)
+                if policy.cleanup_seconds > 0:
+                    schedule_cleanup(message.guild, author.id, policy.cleanup_seconds)
+                else:
+                    REST_SCHEDULER.submit("delete", guild_id, author.id, message.delete, route=("delete", message.channel.id))
+                REST_SCHEDULER.submit("timeout", guild_id, author.id,
+                                      lambda: author.timeout(datetime.now() + timedelta(minutes=2), reason="Mentions excessives"),
+                                      window=120, incident="mentions")
 
     await bot.process_commands(message)
 
 @bot.event
+@instrumented
 async def on_member_join(member):
     guild_id = member.guild.id
-    data = get_server_data(guild_id)
+    data = await fetch_server_data(guild_id)
     
     if data["raid_protection"]:
+        # Vague d'arrivées : sanction groupée de toute la cohorte
+        raid = JOIN_DETECTOR.record(
+            guild_id, member,
+            data["raid_join_threshold"], data["raid_join_window"], data["raid_account_span_hours"]
+        )
+        if raid:
+            cohort, new_raid = raid
+            await handle_raid_joins(member.guild, cohort, new_raid)
+            return
+
         # Vérifier compte récent (moins de 7 jours)
         account_age = datetime.now() - member.created_at.replace(tzinfo=None)
         if account_age.days < 7:
             try:
-                await member.ban(reason="Protection anti-raid: compte trop récent")
-                log_channel_id = data["log_channel_id"]
-                if log_channel_id:
-                    channel = bot.get_channel(log_channel_id)
-                    if channel:
-                        embed = discord.Embed(title="🛡️ Anti-raid", description=f"{member.mention} banni (compte récent)", color=0xff0000)
-                        await channel.send(embed=embed)
+                await REST_SCHEDULER.call("ban", ("ban", guild_id), lambda: member.ban(reason="Protection anti-raid: compte trop récent"))
+                embed = discord.Embed(title="🛡️ Anti-raid", description=f"{member.mention} banni (compte récent)", color=0xff0000)
+                log_event(member.guild, embed)
             except:
                 pass
 
 @bot.event
+@instrumented
 async def on_member_remove(member):
-    guild_id = member.guild.id
-    data = get_server_data(guild_id)
-    log_channel_id = data["log_channel_id"]
-    
-    if log_channel_id:
-        channel = bot.get_channel(log_channel_id)
-        if channel:
-            embed = discord.Embed(title="👋 Membre parti", description=f"{member.name} a quitté", color=0xffa500)
-            await channel.send(embed=embed)
+    await fetch_server_data(member.guild.id)
+    if LOG_DISPATCHER.get_channel(member.guild.id):
+        embed = discord.Embed(title="👋 Membre parti", description=f"{member.name} a quitté", color=0xffa500)
+        log_event(member.guild, embed)
+
+@bot.event
+async def on_member_update(before, after):
+    if before.roles != after.roles:
+        MEMBER_EXEMPTIONS.invalidate_member(after.guild.id, after.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.permissions != after.permissions:
+        MEMBER_EXEMPTIONS.invalidate_guild(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    MEMBER_EXEMPTIONS.invalidate_guild(role.guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    if LOG_DISPATCHER.channels.get(channel.guild.id) == channel:
+        LOG_DISPATCHER.invalidate_channel(channel.guild.id)
+    RECENT_MESSAGES.forget_channel(channel.guild.id, channel.id)
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    record_command(interaction)
 
 # DÉMARRAGE
 if __name__ == "__main__":
@@ -1126,27 +4254,50 @@ if __name__ == "__main__":
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
-    # Chargement des variables d'environnement
-    load_dotenv()
+    parser = argparse.ArgumentParser(description="Bot de sécurité Astral")
+    parser.add_argument("--migrate-sqlite", action="store_true", help="Importer configs/server_*.json dans SQLite puis quitter")
+    parser.add_argument("--workers", type=int, default=0, help="Lancer N processus, chacun avec une plage de shards")
+    parser.add_argument("--shards", type=int, default=0, help="Nombre total de shards (par défaut: un par processus)")
+    parser.add_argument("--force-sync", action="store_true", help="Synchroniser les commandes même si elles n'ont pas changé")
+    args = parser.parse_args()
+
+    if args.force_sync:
+        FORCE_COMMAND_SYNC = True
+
+    if args.migrate_sqlite:
+        migrate_json_to_sqlite()
+        exit(0)
+
+    # Lecture du token (variables d'environnement chargées au démarrage du module)
     token = os.getenv("DISCORD_BOT_TOKEN")
 
     if not token:
         logging.critical("❌ Token manquant! Définissez la variable DISCORD_BOT_TOKEN dans .env")
-        exit(1)
+        exit(EXIT_CONFIG_ERROR)
 
     # Configuration des dossiers
     os.makedirs('configs', exist_ok=True)
 
+    if args.workers:
+        run_launcher(args.workers, args.shards or args.workers)
+        exit(0)
+
     # Gestion des erreurs spécifiques
     try:
         logging.info("🚀 Démarrage du bot...")
         bot.run(token)
     except discord.errors.LoginFailure:
         logging.critical("🔑 Token invalide! Vérifiez votre token Discord")
-        exit(1)
+        exit(EXIT_CONFIG_ERROR)
+    except discord.errors.PrivilegedIntentsRequired:
+        logging.critical("🔑 Intents privilégiés non activés dans le portail développeur Discord")
+        exit(EXIT_CONFIG_ERROR)
     except KeyboardInterrupt:
         logging.info("🛑 Arrêt manuel du bot")
         exit(0)
     except Exception as e:
         logging.error(f"💥 Erreur inattendue: {str(e)}")
         exit(1)
+    finally:
+        flush_server_data_sync()
+        STORAGE.close()